@@ -19,7 +19,8 @@ Scenario:
 """
 
 import itertools
-import random
+import multiprocessing
+import numpy as np
 from vidigi.resources import VidigiStore
 from vidigi.animation import animate_activity_log
 from vidigi.logging import EventLogger
@@ -37,6 +38,15 @@ T_INTER = 2       # Create a car every ~2 minutes
 SIM_TIME = 60*8     # Simulation time in minutes
 # fmt: on
 
+VERBOSE = False  # Set to True to print a trace of each car as the model runs
+
+
+def rand_int_gen(rng, lo, hi, size=4096):
+    """Yield uniform random integers in [lo, hi], drawn from ``rng`` in batches
+    of ``size`` rather than one call per sample."""
+    while True:
+        yield from rng.integers(lo, hi + 1, size=size).tolist()
+
 
 class Carwash:
     """A carwash has a limited number of machines (``NUM_MACHINES``) to
@@ -48,84 +58,101 @@ class Carwash:
 
     """
 
-    def __init__(self, env, num_machines, washtime):
+    __slots__ = ('env', 'machine', 'washtime', 'dirt_removed', 'logger')
+
+    def __init__(self, env, num_machines, washtime, rng):
         self.env = env
         self.machine = VidigiStore(env, num_resources=num_machines)
         self.washtime = washtime
+        self.dirt_removed = rand_int_gen(rng, 50, 99)
         self.logger = EventLogger(env=self.env)
 
-    def wash(self, car):
-        """The washing processes. It takes a ``car`` processes and tries
-        to clean it."""
-        yield self.env.timeout(self.washtime)
-        pct_dirt = random.randint(50, 99)
-        print(f"Carwash removed {pct_dirt}% of {car}'s dirt.")
-
 
 def car(env, name, cw):
-    """The car process (each car has a ``name``) arrives at the carwash
+    """The car process (each car has an integer ``name``) arrives at the carwash
     (``cw``) and requests a cleaning machine.
 
     It then starts the washing process, waits for it to finish and
     leaves to never come back ...
 
     """
-    print(f'{name} arrives at the carwash at {env.now:.2f}.')
+    if VERBOSE:
+        print(f'Car {name} arrives at the carwash at {env.now:.2f}.')
     cw.logger.log_arrival(entity_id=name)
     cw.logger.log_queue(entity_id=name, event='carwash_queue_wait_begins')
     with cw.machine.request() as request:
         carwash_spot = yield request
+        spot_id = carwash_spot.id_attribute
 
-        print(f'{name} enters the carwash at {env.now:.2f}.')
+        if VERBOSE:
+            print(f'Car {name} enters the carwash at {env.now:.2f}.')
 
         cw.logger.log_resource_use_start(entity_id=name, event="carwashing_begins",
-                                  resource_id=carwash_spot.id_attribute)
+                                         resource_id=spot_id)
 
-        yield env.process(cw.wash(name))
+        # The washing itself is just a delay, so wait on it directly rather
+        # than starting a separate process for every car
+        yield env.timeout(cw.washtime)
+        pct_dirt = next(cw.dirt_removed)
+        if VERBOSE:
+            print(f"Carwash removed {pct_dirt}% of Car {name}'s dirt.")
 
         cw.logger.log_resource_use_end(entity_id=name, event="carwashing_ends",
-                            resource_id=carwash_spot.id_attribute)
+                                       resource_id=spot_id)
 
-        print(f'{name} leaves the carwash at {env.now:.2f}.')
+        if VERBOSE:
+            print(f'Car {name} leaves the carwash at {env.now:.2f}.')
         cw.logger.log_departure(entity_id=name)
 
 
-def setup(env, num_machines, washtime, t_inter, duration):
+def setup(env, num_machines, washtime, t_inter, duration, rng):
     """Create a carwash, a number of initial cars and keep creating cars
     approx. every ``t_inter`` minutes."""
     # Create the carwash
-    carwash = Carwash(env, num_machines, washtime)
+    carwash = Carwash(env, num_machines, washtime, rng)
 
     car_count = itertools.count()
+    inter_arrival_times = rand_int_gen(rng, t_inter - 2, t_inter + 2)
+
+    car_procs = []
 
     # Create 4 initial cars
     for _ in range(4):
-        env.process(car(env, f'Car {next(car_count)}', carwash))
+        car_procs.append(env.process(car(env, next(car_count), carwash)))
 
     # Create more cars while the simulation is running
     while env.now < duration:
-        yield env.timeout(random.randint(t_inter - 2, t_inter + 2))
-        env.process(car(env, f'Car {next(car_count)}', carwash))
-
-    # Allow remaining events to finish before returning
-    yield env.timeout(0)
-    carwash.logger.to_dataframe().to_csv(f"logs_{NUM_MACHINES}_machines_{T_INTER}_IAT.csv")
+        yield env.timeout(next(inter_arrival_times))
+        car_procs.append(env.process(car(env, next(car_count), carwash)))
 
+    # Wait for every car still in the carwash to finish before exporting the log
+    yield simpy.AllOf(env, car_procs)
+    # Cars are logged with integer IDs; only build the display label once, on export
+    event_log_df = carwash.logger.to_dataframe()
+    event_log_df["entity_id"] = "Car " + event_log_df["entity_id"].astype(str)
+    event_log_df.to_csv(f"logs_{num_machines}_machines_{t_inter}_IAT.csv")
+    # Hand the log back as well, so callers running the model in the same
+    # process can use it without reading the CSV back in
+    return event_log_df
 
-# Setup and start the simulation
-print('Carwash')
-print('Check out http://youtu.be/fXXmeP9TvBg while simulating ... ;-)')
-random.seed(RANDOM_SEED)  # This helps to reproduce the results
 
-def run_model():
+def run_model(t_inter):
     # Create an environment and start the setup process
     env = simpy.Environment()
-    carwash_process = env.process(setup(env, NUM_MACHINES, WASHTIME, T_INTER, SIM_TIME))
-    # Execute!
-    env.run(until=carwash_process)
-
-run_model()
-
-T_INTER = 7
-
-run_model()
+    # Each run gets its own generator, so its results don't depend on what ran before
+    # it in the same process
+    rng = np.random.default_rng(RANDOM_SEED)
+    carwash_process = env.process(setup(env, NUM_MACHINES, WASHTIME, t_inter, SIM_TIME, rng))
+    # Execute!  Running until the setup process ends returns its event log
+    return env.run(until=carwash_process)
+
+
+if __name__ == "__main__":
+    # Setup and start the simulation
+    print('Carwash')
+    print('Check out http://youtu.be/fXXmeP9TvBg while simulating ... ;-)')
+
+    # The two arrival rates are independent runs that each write their own log,
+    # so run them side by side in separate processes
+    with multiprocessing.Pool(2) as pool:
+        pool.map(run_model, [T_INTER, 7])
@@ -20,8 +20,7 @@ Scenario:
 
 """
 
-import itertools
-import random
+import numpy as np
 
 from vidigi.resources import VidigiStore
 from vidigi.animation import animate_activity_log
@@ -44,8 +43,17 @@ T_INTER = [30, 300]        # Interval between car arrivals [min, max] (seconds)
 SIM_TIME = 60*60*6           # Simulation duration (seconds)
 # fmt: on
 
+VERBOSE = False  # Set to True to print a trace of cars and tank trucks as the model runs
 
-def car(name, env, gas_station, station_tank, logger):
+
+def rand_int_gen(rng, lo, hi, size=4096):
+    """Yield uniform random integers in [lo, hi], drawn from ``rng`` in batches
+    of ``size`` rather than one call per sample."""
+    while True:
+        yield from rng.integers(lo, hi + 1, size=size).tolist()
+
+
+def car(name, env, gas_station, station_tank, logger, car_tank_levels, payment_times):
     """A car arrives at the gas station for refueling.
 
     It requests one of the gas station's fuel pumps and tries to get the
@@ -53,55 +61,61 @@ def car(name, env, gas_station, station_tank, logger):
     depleted, the car has to wait for the tank truck to arrive.
 
     """
-    car_tank_level = random.randint(*CAR_TANK_LEVEL)
-    logger.log_arrival(entity_id=name)
-    print(f'{env.now:6.1f} s: {name} arrived at gas station')
-    logger.log_queue(entity_id=name, event='pump_queue_wait_begins',
-                     fuel_level_start=car_tank_level, fuel_level_end=CAR_TANK_SIZE)
+    car_tank_level = next(car_tank_levels)
+    logger.log_entity_attributes(entity_id=name, fuel_level_start=car_tank_level,
+                                 fuel_level_end=CAR_TANK_SIZE)
+    if VERBOSE:
+        print(f'{env.now:6.1f} s: Car {name} arrived at gas station')
+    # Events that happen at the same moment are logged together in one call
+    logger.log_batch([
+        {"entity_id": name, "event_type": "arrival_departure", "event": "arrival"},
+        {"entity_id": name, "event_type": "queue", "event": "pump_queue_wait_begins"},
+    ])
     with gas_station.request() as req:
         # Request one of the gas pumps
         gas_pump = yield req
+        pump_id = gas_pump.id_attribute
 
         # Get the required amount of fuel
         fuel_required = CAR_TANK_SIZE - car_tank_level
         yield station_tank.get(fuel_required)
 
-        logger.log_resource_use_start(entity_id=name, event="payment_begins",
-                                  resource_id=gas_pump.id_attribute,
-                     fuel_level_start=car_tank_level, fuel_level_end=CAR_TANK_SIZE)
+        logger.log_resource_use_start(entity_id=name, event="payment_begins", resource_id=pump_id)
 
-        yield env.timeout(random.randint(*PAYMENT_TIME))
+        yield env.timeout(next(payment_times))
 
-        logger.log_resource_use_end(entity_id=name, event="payment_ends",
-                            resource_id=gas_pump.id_attribute,
-                     fuel_level_start=car_tank_level, fuel_level_end=CAR_TANK_SIZE)
-
-        logger.log_resource_use_start(entity_id=name, event="pumping_begins",
-                            resource_id=gas_pump.id_attribute,
-                fuel_level_start=car_tank_level, fuel_level_end=CAR_TANK_SIZE)
+        logger.log_batch([
+            {"entity_id": name, "event_type": "resource_use_end", "event": "payment_ends",
+             "resource_id": pump_id},
+            {"entity_id": name, "event_type": "resource_use", "event": "pumping_begins",
+             "resource_id": pump_id},
+        ])
 
         # The "actual" refueling process takes some time
         yield env.timeout(fuel_required / REFUELING_SPEED)
 
-        logger.log_resource_use_end(entity_id=name, event="pumping_ends",
-                                  resource_id=gas_pump.id_attribute,
-                     fuel_level_start=car_tank_level, fuel_level_end=CAR_TANK_SIZE)
-
-        print(f'{env.now:6.1f} s: {name} refueled with {fuel_required:.1f}L')
-        logger.log_departure(entity_id=name)
+        if VERBOSE:
+            print(f'{env.now:6.1f} s: Car {name} refueled with {fuel_required:.1f}L')
+        logger.log_batch([
+            {"entity_id": name, "event_type": "resource_use_end", "event": "pumping_ends",
+             "resource_id": pump_id},
+            {"entity_id": name, "event_type": "arrival_departure", "event": "depart"},
+        ])
 
 
 def gas_station_control(env, station_tank, logger):
     """Periodically check the level of the gas station tank and call the tank
     truck if the level falls below a threshold."""
     truck_call_id = 0
+    threshold_level = station_tank.capacity * THRESHOLD / 100
 
     while True:
-        if station_tank.level / station_tank.capacity * 100 < THRESHOLD:
+        if station_tank.level < threshold_level:
             # We need to call the tank truck now!
             logger.log_arrival(entity_id=f"Call {truck_call_id}")
             logger.log_queue(entity_id=f"Call {truck_call_id}", event="calling_truck")
-            print(f'{env.now:6.1f} s: Calling tank truck')
+            if VERBOSE:
+                print(f'{env.now:6.1f} s: Calling tank truck')
             # Wait for the tank truck to arrive and refuel the station tank
             yield env.process(tank_truck(env, station_tank, logger, truck_call_id))
 
@@ -134,62 +148,98 @@ def tank_truck(env, station_tank, logger, truck_call_id):
 
     refuel_time = TANK_TRUCK_REFUEL_TIME     # total time truck stays
     refuel_rate = 10                         # L/s (or adjust based on need)
-    step = 1                                 # seconds between each refill step
+    step = 20                                # seconds between each refill step
+
+    # Keep going until the truck's time is up and the tank is (almost) full
+    capacity = station_tank.capacity
+    target_level = capacity * 0.98
+    increment = refuel_rate * step
 
     total_refueled = 0
     elapsed = 0
 
-    while (elapsed < refuel_time) | station_tank.level < (STATION_TANK_SIZE - (STATION_TANK_SIZE*0.02)):
+    while elapsed < refuel_time or station_tank.level < target_level:
         yield env.timeout(step)
         elapsed += step
 
-        increment = refuel_rate * step
-        space_available = station_tank.capacity - station_tank.level
+        space_available = capacity - station_tank.level
         actual_increment = min(increment, space_available)
 
         if actual_increment > 0:
             station_tank.put(actual_increment)
             total_refueled += actual_increment
 
-    print(f'{env.now:6.1f} s: Truck {truck_call_id} refueled station with {total_refueled:.1f}L')
+    if VERBOSE:
+        print(f'{env.now:6.1f} s: Truck {truck_call_id} refueled station with {total_refueled:.1f}L')
     logger.log_departure(entity_id=f"Truck {truck_call_id}")
 
 
 
-def car_generator(env, gas_station, station_tank, logger):
+def car_generator(env, gas_station, station_tank, logger, rng):
     """Generate new cars that arrive at the gas station."""
-    for i in itertools.count():
-        yield env.timeout(random.randint(*T_INTER))
-        env.process(car(f'Car {i}', env, gas_station, station_tank, logger))
+    car_tank_levels = rand_int_gen(rng, *CAR_TANK_LEVEL)
+    payment_times = rand_int_gen(rng, *PAYMENT_TIME)
 
-def fuel_monitor(env, station_tank, logger, interval=1):
-    """Logs the fuel level at regular intervals."""
-    while True:
-        logger.log_queue(
+    # Arrival times don't depend on the state of the model, so sample them all
+    # up front - enough to cover the run even if every gap is the shortest possible
+    n_max = SIM_TIME // T_INTER[0] + 10
+    arrival_times = np.cumsum(rng.integers(T_INTER[0], T_INTER[1] + 1, size=n_max))
+    arrival_times = arrival_times[arrival_times < SIM_TIME].tolist()
+
+    for i, arrival_time in enumerate(arrival_times):
+        yield env.timeout(arrival_time - env.now)
+        env.process(car(i, env, gas_station, station_tank, logger,
+                        car_tank_levels, payment_times))
+
+
+class MonitoredTank(simpy.Container):
+    """A container that logs its fuel level whenever fuel is added or removed,
+    rather than having a separate process poll the level at a fixed interval."""
+
+    def __init__(self, env, logger, capacity, init):
+        super().__init__(env, capacity=capacity, init=init)
+        self.logger = logger
+        self._log_level()
+
+    def _log_level(self):
+        self.logger.log_queue(
             entity_id="StationTank",
             event_type="fuel_level_change",
             event="fuel_level_change",
-            value=station_tank.level
+            value=self._level
         )
-        yield env.timeout(interval)
+
+    def _do_put(self, event):
+        if super()._do_put(event):
+            self._log_level()
+            return True
+
+    def _do_get(self, event):
+        if super()._do_get(event):
+            self._log_level()
+            return True
 
 
 # Setup and start the simulation
 print('Gas Station refuelling')
-random.seed(RANDOM_SEED)
 
 # Create environment and start processes
 env = simpy.Environment()
+# The run's random numbers all come from one generator, created here for the run
+rng = np.random.default_rng(RANDOM_SEED)
 gas_station = VidigiStore(env, num_resources=2)
-station_tank = simpy.Container(env, capacity=STATION_TANK_SIZE, init=STATION_TANK_SIZE)
 logger = EventLogger(env=env)
 logger.log_queue(entity_id="parameter", event_type="parameter", event="tank_size", value=STATION_TANK_SIZE)
+station_tank = MonitoredTank(env, logger, capacity=STATION_TANK_SIZE, init=STATION_TANK_SIZE)
 env.process(gas_station_control(env, station_tank, logger))
-env.process(car_generator(env, gas_station, station_tank, logger))
-env.process(fuel_monitor(env, station_tank, logger))
+env.process(car_generator(env, gas_station, station_tank, logger, rng))
 
 
 # Execute!
 env.run(until=SIM_TIME)
 
-logger.to_csv("gas_station_log.csv")
+# Cars are logged with integer IDs; only build their display label once, on export
+event_log_df = logger.to_dataframe()
+is_car = event_log_df["entity_id"].map(type) == int
+event_log_df.loc[is_car, "entity_id"] = "Car " + event_log_df.loc[is_car, "entity_id"].astype(str)
+event_log_df.to_csv("gas_station_log.csv", index=False)
@@ -1,5 +1,9 @@
+import math
+import multiprocessing
 import simpy
-import random
+import numpy as np
+import pandas as pd
+from functools import lru_cache
 from typing import Tuple
 from vidigi.logging import EventLogger
 
@@ -30,117 +34,299 @@ PACKAGES_PER_BATCH = (1, 5)
 OTHER_TASK_TIME = (2, 4)
 OTHER_TASK_PROB = 0.3
 SIM_DURATION = 60 * 24
+RANDOM_SEED = 42
+N_RUNS = 1  # Number of independent runs, each with its own seed and output file
 
-# Shared dictionary of robot positions
-robot_positions = {}
+
+def rand_int_gen(rng, lo, hi, size=4096):
+    """Yield uniform random integers in [lo, hi], drawn from ``rng`` in batches
+    of ``size`` rather than one call per sample."""
+    while True:
+        yield from rng.integers(lo, hi + 1, size=size).tolist()
+
+
+def rand_uniform_gen(rng, size=4096):
+    """Yield uniform random floats in [0, 1), drawn from ``rng`` in batches."""
+    while True:
+        yield from rng.random(size).tolist()
+
+
+# Positions are compared on a grid of 1/POS_SCALE pixels, as integers, rather
+# than with a floating point tolerance
+POS_SCALE = 100
+
+
+def quantize(pos):
+    """Return pos as integer grid coordinates."""
+    return (round(pos[0] * POS_SCALE), round(pos[1] * POS_SCALE))
+
+
+class SpatialHashGrid:
+    """Positions of stationary robots, bucketed into square cells.
+
+    Positions are stored quantized to integer grid coordinates, so two robots
+    are at the same point only if their grid coordinates are equal - and then
+    they are also in the same cell. Checking whether a point is occupied only
+    has to look at the robots in that one cell, rather than every robot. With
+    only a handful of robots a plain scan is just as quick, so that is used
+    instead.
+    """
+
+    def __init__(self, cell_size=20, linear_scan_below=8):
+        self.cell_size = cell_size * POS_SCALE
+        self.linear_scan_below = linear_scan_below
+        self.positions = {}
+        self.cells = {}
+        # quantized position -> event that fires when a robot next leaves it
+        self.vacated_events = {}
+
+    def _cell(self, ipos):
+        return (ipos[0] // self.cell_size, ipos[1] // self.cell_size)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def set(self, key, pos):
+        self.remove(key)
+        ipos = quantize(pos)
+        self.positions[key] = ipos
+        self.cells.setdefault(self._cell(ipos), set()).add(key)
+
+    def remove(self, key):
+        ipos = self.positions.pop(key, None)
+        if ipos is not None:
+            cell = self._cell(ipos)
+            self.cells[cell].discard(key)
+            if not self.cells[cell]:
+                del self.cells[cell]
+            vacated = self.vacated_events.pop(ipos, None)
+            if vacated is not None:
+                vacated.succeed()
+
+    def vacated(self, env, pos):
+        """Return an event that fires the next time a robot leaves pos."""
+        ipos = quantize(pos)
+        if ipos not in self.vacated_events:
+            self.vacated_events[ipos] = env.event()
+        return self.vacated_events[ipos]
+
+    def is_occupied(self, pos, exclude=None):
+        """Whether any robot other than the one keyed exclude is at pos."""
+        ipos = quantize(pos)
+        if len(self.positions) < self.linear_scan_below:
+            candidates = self.positions
+        else:
+            candidates = self.cells.get(self._cell(ipos), ())
+        return any(
+            key != exclude and self.positions[key] == ipos
+            for key in candidates
+        )
+
+
+@lru_cache(maxsize=None)
+def plan_route(start, destination, outbound):
+    """Work out the legs of the Manhattan path from start to destination.
+
+    Robots only ever travel between the LAYOUT points (plus their packing
+    offsets), so there are only a small number of distinct routes and each is
+    only worked out once.
+
+    Returns a tuple with, for each leg, (leg_start, leg_end, travel_time_units,
+    steps, remaining, whole_steps_end), where whole_steps_end is where the robot
+    is after the whole time units of the leg.
+    """
+    start_x, start_y = start
+    dest_x, dest_y = destination
+
+    if outbound:
+        sequence = [("x", dest_x - start_x), ("y", dest_y - start_y)]
+    else:
+        sequence = [("y", dest_y - start_y), ("x", dest_x - start_x)]
+
+    legs = []
+    leg_start = start
+    for axis, delta in sequence:
+        if delta != 0:
+            travel_time_units = abs(delta) / SPEED
+            # Split the distance rather than the time, so a leg that is a whole
+            # number of time units long has a remaining of exactly 0 and no
+            # fractional step
+            steps, remainder_distance = divmod(abs(delta), SPEED)
+            steps = int(steps)
+            remaining = remainder_distance / SPEED
+            move_per_unit = delta / travel_time_units
+
+            leg_end = (
+                dest_x if axis == "x" else leg_start[0],
+                dest_y if axis == "y" else leg_start[1],
+            )
+            whole_steps_end = (
+                leg_start[0] + move_per_unit * steps if axis == "x" else leg_start[0],
+                leg_start[1] + move_per_unit * steps if axis == "y" else leg_start[1],
+            )
+            legs.append((leg_start, leg_end, travel_time_units, steps, remaining, whole_steps_end))
+            leg_start = leg_end
+
+    return tuple(legs)
 
 
 def travel_time(pos_a: Tuple[int, int], pos_b: Tuple[int, int]) -> float:
-    dist = ((pos_a[0] - pos_b[0]) ** 2 + (pos_a[1] - pos_b[1]) ** 2) ** 0.5
-    return dist / SPEED
+    return math.hypot(pos_a[0] - pos_b[0], pos_a[1] - pos_b[1]) / SPEED
+
+
+class PositionLog:
+    """Robot movements, recorded as the straight-line segments each robot travels.
+
+    Rather than a process sampling every robot's position once per time unit while
+    the model runs, the positions at each time unit are worked out from these
+    segments in one go once the run is over.
+    """
+
+    def __init__(self):
+        # robot name -> list of (start time, start x, start y, end x, end y, duration)
+        self.segments = {}
+
+    def add_robot(self, name):
+        """Start recording a robot's movements, returning the list its segments
+        should be appended to."""
+        return self.segments.setdefault(name, [])
+
+    def to_dataframe(self, duration):
+        """Return each robot's position at every time unit from 0 to duration as
+        position_poll events, in the same format as EventLogger."""
+        times = np.arange(duration, dtype=float)
+        frames = []
+        for name, segments in self.segments.items():
+            t0, start_x, start_y, end_x, end_y, seg_duration = np.array(segments).T
+            # The segment each robot was on at each time unit
+            idx = np.searchsorted(t0, times, side="right") - 1
+            elapsed = times - t0[idx]
+            frac = np.minimum(
+                np.divide(elapsed, seg_duration[idx], out=np.ones_like(elapsed),
+                          where=seg_duration[idx] > 0),
+                1.0
+            )
+            arrived = frac >= 1.0
+            frames.append(pd.DataFrame({
+                "entity_id": name,
+                "event_type": "position_poll",
+                "event": "position",
+                "time": times,
+                "x": np.where(arrived, end_x[idx], start_x[idx] + (end_x[idx] - start_x[idx]) * frac),
+                "y": np.where(arrived, end_y[idx], start_y[idx] + (end_y[idx] - start_y[idx]) * frac),
+            }))
+        return pd.concat(frames, ignore_index=True)
 
 
 class PackingRobot:
-    def __init__(self, env, name, logger, packing_slot=0):
+    def __init__(self, env, name, logger, position_log, rng, packing_slot=0):
         self.env = env
         self.name = name
         self.logger = logger
+        self.position_log = position_log
+        self._segments = position_log.add_robot(name)
+        self.rng = rng
+        # Integer key for this robot in the shared position grid
+        self.idx = packing_slot
+        self.task_times = rand_int_gen(rng, *OTHER_TASK_TIME)
+        self.other_task_draws = rand_uniform_gen(rng)
+        # Positions are shared between all the robots in the same environment, but
+        # are kept on the env so that separate runs don't see each other's robots
+        if not hasattr(env, "robot_positions"):
+            env.robot_positions = SpatialHashGrid()
+        self.robot_positions = env.robot_positions
         self.packing_offset = (
             (packing_slot % 4) * 15,          # x: 0,15,30,45 then back to 0
             (packing_slot // 4) * 30          # y: 0 for first 4, then 30, 60, etc.
         )
-        self.pos = self._with_packing_offset(LAYOUT["packing"])
-        robot_positions[self.name] = self.pos
-        self.env.process(self.poll_position())
-        self.logger.log_arrival(entity_id=self.name, x=self.pos[0], y=self.pos[1])
-        self.logger.log_queue(entity_id=self.name, event="packing", x=self.pos[0], y=self.pos[1])
+        # This robot's spot in the packing area never changes, so work it out once
+        self._packing_pos = (LAYOUT["packing"][0] + self.packing_offset[0],
+                             LAYOUT["packing"][1] + self.packing_offset[1])
+        self._packing_ipos = quantize(self._packing_pos)
+        self._set_pos(self._packing_pos)
+        x, y = self.pos
+        self.logger.log_arrival(entity_id=self.name, x=x, y=y)
+        self.logger.log_queue(entity_id=self.name, event="packing", x=x, y=y)
 
     def _with_packing_offset(self, base_pos):
         """Return position adjusted if in packing area."""
         if base_pos == LAYOUT["packing"]:
-            return (base_pos[0] + self.packing_offset[0],
-                    base_pos[1] + self.packing_offset[1])
+            return self._packing_pos
         else:
             return base_pos
 
+    @property
+    def pos(self):
+        """Current position, interpolated along the segment the robot is travelling."""
+        t0, start, end, duration = self._motion
+        elapsed = self.env.now - t0
+        if elapsed >= duration:
+            return end
+        frac = elapsed / duration
+        return (start[0] + (end[0] - start[0]) * frac,
+                start[1] + (end[1] - start[1]) * frac)
+
+    def _set_motion(self, start, end, duration):
+        """Start travelling in a straight line from start to end, taking duration
+        time units (a duration of 0 places the robot, stationary, at end)."""
+        self._motion = (self.env.now, start, end, duration)
+        self._segments.append((self.env.now, start[0], start[1], end[0], end[1], duration))
+
+    def _set_pos(self, pos):
+        """Place the robot, stationary, at pos."""
+        self._set_motion(pos, pos, 0.0)
+        self.robot_positions.set(self.idx, pos)
+
     def _logical_pos(self, pos):
         """Return the logical position without visual offset."""
-        # If within 1e-6 of packing coords (ignoring offset), treat as packing
-        px, py = LAYOUT["packing"]
-        if abs(pos[0] - px - self.packing_offset[0]) < 1e-6 and \
-        abs(pos[1] - py - self.packing_offset[1]) < 1e-6:
+        # If at this robot's (offset) packing position, treat as packing
+        if quantize(pos) == self._packing_ipos:
             return LAYOUT["packing"]
         return pos
 
-    def poll_position(self):
-        while True:
-            self.logger.log_custom_event(
-                entity_id=self.name,
-                event_type="position_poll",
-                event="position",
-                x=self.pos[0],
-                y=self.pos[1],
-            )
-            yield self.env.timeout(1)
-
     def move_to(self, location_name, pathway, outbound=True):
         """Move robot step-by-step."""
         destination = LAYOUT[location_name]
-        start_x, start_y = self.pos
-        dest_x, dest_y = destination
 
         yield from self._do_stepwise_move(destination, outbound)
 
 
     def _do_stepwise_move(self, destination, outbound):
         """Helper for stepwise movement with blocking except in packing.
+
+        Each leg is travelled with a single timeout rather than one per time unit;
+        the robot's position part way along a leg is interpolated by ``pos``.
         """
-        start_x, start_y = self.pos
-        dest_x, dest_y = destination
+        for (leg_start, leg_end, travel_time_units,
+             steps, remaining, whole_steps_end) in plan_route(self.pos, destination, outbound):
+            # As the robot only waits before the fractional step, it is where it
+            # will be after the whole steps that decides whether it may be blocked
+            if (remaining > 0 and
+                self._logical_pos(whole_steps_end) != LAYOUT["packing"] and
+                self._logical_pos(leg_end) != LAYOUT["packing"]):
+                # --- Whole steps ---
+                if steps > 0:
+                    yield from self._move_segment(whole_steps_end, steps, leg_complete=False)
 
-        if outbound:
-            sequence = [("x", dest_x - start_x), ("y", dest_y - start_y)]
-        else:
-            sequence = [("y", dest_y - start_y), ("x", dest_x - start_x)]
+                # --- Wait for the end of the leg to be free, then the fractional step ---
+                while self.robot_positions.is_occupied(leg_end, exclude=self.idx):
+                    yield self.robot_positions.vacated(self.env, leg_end)
 
-        for axis, delta in sequence:
-            if delta != 0:
-                travel_time_units = abs(delta) / SPEED
-                steps = int(travel_time_units)
-                remaining = travel_time_units - steps
-                move_per_unit = delta / travel_time_units
+                yield from self._move_segment(leg_end, remaining)
+            else:
+                yield from self._move_segment(leg_end, travel_time_units)
 
-                # --- Whole steps ---
-                for _ in range(steps):
-                    next_pos = (
-                        self.pos[0] + move_per_unit if axis == "x" else self.pos[0],
-                        self.pos[1] + move_per_unit if axis == "y" else self.pos[1],
-                    )
-
-                    yield self.env.timeout(1)
-                    self.pos = self._with_packing_offset(next_pos)
-                    robot_positions[self.name] = self.pos
-
-                # --- Remaining fractional step ---
-                if remaining > 0:
-                    next_pos = (
-                        self.pos[0] + move_per_unit * remaining if axis == "x" else self.pos[0],
-                        self.pos[1] + move_per_unit * remaining if axis == "y" else self.pos[1],
-                    )
-
-                    if (self._logical_pos(self.pos) != LAYOUT["packing"] and
-                        self._logical_pos(next_pos) != LAYOUT["packing"]):
-                        while any(
-                            other != self.name and
-                            abs(robot_positions[other][0] - next_pos[0]) < 1e-6 and
-                            abs(robot_positions[other][1] - next_pos[1]) < 1e-6
-                            for other in robot_positions
-                        ):
-                            yield self.env.timeout(0.1)
-
-                    yield self.env.timeout(remaining)
-                    self.pos = self._with_packing_offset(next_pos)
-                    robot_positions[self.name] = self.pos
+    def _move_segment(self, end, duration, leg_complete=True):
+        """Travel in a straight line to end, taking duration time units.
+
+        The packing offset can only apply at the end of a leg, so it is only
+        checked for if leg_complete is True.
+        """
+        self._set_motion(self.pos, end, duration)
+        # A robot in transit isn't occupying any point, so can't block others
+        self.robot_positions.remove(self.idx)
+        yield self.env.timeout(duration)
+        self._set_pos(self._with_packing_offset(end) if leg_complete else end)
 
 
     def pickup_packages(self, count, pickup_name):
@@ -148,45 +334,75 @@ class PackingRobot:
 
         yield self.env.process(self.move_to("packing", "to_packing", outbound=False))
 
-        self.logger.log_queue(entity_id=self.name, event=pickup_name, x=self.pos[0], y=self.pos[1], package_count=count)
-        for _ in range(count):
-            yield self.env.timeout(PACKING_TIME)
+        x, y = self.pos
+        self.logger.log_queue(entity_id=self.name, event=pickup_name, x=x, y=y, package_count=count)
+        # Nothing happens between packages, so pack the whole batch in one timeout
+        yield self.env.timeout(count * PACKING_TIME)
 
-        if random.random() < OTHER_TASK_PROB:
+        if next(self.other_task_draws) < OTHER_TASK_PROB:
             yield self.env.process(self.other_task())
 
-        self.logger.log_queue(entity_id=self.name, event="packing", x=self.pos[0], y=self.pos[1])
+        x, y = self.pos
+        self.logger.log_queue(entity_id=self.name, event="packing", x=x, y=y)
 
     def other_task(self):
         yield self.env.process(self.move_to("maintenance", "to_maintenance"))
-        task_time = random.randint(*OTHER_TASK_TIME)
-        self.logger.log_queue(entity_id=self.name, event="maintenance", x=self.pos[0], y=self.pos[1], task_duration_mins=task_time)
+        task_time = next(self.task_times)
+        x, y = self.pos
+        self.logger.log_queue(entity_id=self.name, event="maintenance", x=x, y=y, task_duration_mins=task_time)
         yield self.env.timeout(task_time)
         yield self.env.process(self.move_to("packing", "return_from_maintenance"))
 
 
 def package_arrival(env, robot):
+    inter_arrival_times = rand_int_gen(robot.rng, 4, 8)
+    batch_sizes = rand_int_gen(robot.rng, *PACKAGES_PER_BATCH)
+    pickup_indices = rand_int_gen(robot.rng, 0, len(PICKUP_POINTS) - 1)
     while True:
-        yield env.timeout(random.randint(4, 8))
-        num_packages = random.randint(*PACKAGES_PER_BATCH)
-        pickup_name = random.choice(PICKUP_POINTS)
+        yield env.timeout(next(inter_arrival_times))
+        num_packages = next(batch_sizes)
+        pickup_name = PICKUP_POINTS[next(pickup_indices)]
         yield env.process(robot.pickup_packages(num_packages, pickup_name))
 
 
 # ---------------------------
 # Running the simulation
 # ---------------------------
-if __name__ == "__main__":
+def run_once(run_number, n_robots=8):
+    """Run the model once, seeded from RANDOM_SEED and run_number, and return
+    the event log (including position polls) as a dataframe."""
     env = simpy.Environment()
-    logger = EventLogger(env=env)
+    logger = EventLogger(env=env, run_number=run_number)
+    rng = np.random.default_rng(RANDOM_SEED + run_number)
+    position_log = PositionLog()
 
-    n_robots=7
-
-    robots = [PackingRobot(env, f"RoboPack-{i+1}", logger, packing_slot=i) for i in range(8)]
+    robots = [PackingRobot(env, f"RoboPack-{i+1}", logger, position_log, rng, packing_slot=i)
+              for i in range(n_robots)]
     for robot in robots:
         env.process(package_arrival(env, robot))
 
     env.run(until=SIM_DURATION)
     for robot in robots:
-        logger.log_departure(entity_id=robot.name, x=robot.pos[0], y=robot.pos[1])
-    logger.to_csv("robot_log_multiple.csv")
+        x, y = robot.pos
+        logger.log_departure(entity_id=robot.name, x=x, y=y)
+
+    position_df = position_log.to_dataframe(SIM_DURATION)
+    position_df["run_number"] = run_number
+    event_log_df = pd.concat([logger.to_dataframe(), position_df], ignore_index=True)
+    return event_log_df.sort_values("time", kind="stable")
+
+
+if __name__ == "__main__":
+    # Each run is independent, so when there are several they are spread across
+    # processes
+    if N_RUNS == 1:
+        run_logs = [run_once(0)]
+    else:
+        with multiprocessing.Pool() as pool:
+            run_logs = pool.map(run_once, range(N_RUNS))
+
+    # The animation works on a single run, so each run gets its own file; the
+    # first goes to robot_log_multiple.csv
+    for run_number, run_log in enumerate(run_logs):
+        suffix = "" if run_number == 0 else f"_run_{run_number}"
+        run_log.to_csv(f"robot_log_multiple{suffix}.csv", index=False)
@@ -1,5 +1,8 @@
+import math
 import simpy
-import random
+import numpy as np
+import pandas as pd
+from functools import lru_cache
 from typing import Tuple
 from vidigi.logging import EventLogger
 
@@ -32,34 +35,134 @@ PACKAGES_PER_BATCH = (1, 5)
 OTHER_TASK_TIME = (2, 4)
 OTHER_TASK_PROB = 0.3
 SIM_DURATION = 60*24
+RANDOM_SEED = 42
+
+
+def rand_int_gen(rng, lo, hi, size=4096):
+    """Yield uniform random integers in [lo, hi], drawn from ``rng`` in batches
+    of ``size`` rather than one call per sample."""
+    while True:
+        yield from rng.integers(lo, hi + 1, size=size).tolist()
+
+
+def rand_uniform_gen(rng, size=4096):
+    """Yield uniform random floats in [0, 1), drawn from ``rng`` in batches."""
+    while True:
+        yield from rng.random(size).tolist()
+
+
+@lru_cache(maxsize=None)
+def plan_route(start, destination, outbound):
+    """Work out the (leg_end, travel_time) of each leg of the Manhattan path
+    from start to destination.
+
+    The robot only ever travels between LAYOUT points, so each distinct route
+    is only worked out once.
+    """
+    start_x, start_y = start
+    dest_x, dest_y = destination
+
+    if outbound:
+        sequence = [("x", dest_x - start_x), ("y", dest_y - start_y)]
+    else:
+        sequence = [("y", dest_y - start_y), ("x", dest_x - start_x)]
+
+    legs = []
+    leg_start = start
+    for axis, delta in sequence:
+        if delta != 0:
+            leg_end = (
+                dest_x if axis == "x" else leg_start[0],
+                dest_y if axis == "y" else leg_start[1],
+            )
+            legs.append((leg_end, abs(delta) / SPEED))
+            leg_start = leg_end
+
+    return tuple(legs)
 
 
 def travel_time(pos_a: Tuple[int, int], pos_b: Tuple[int, int]) -> float:
     """Calculate travel time between two coordinates."""
-    dist = ((pos_a[0] - pos_b[0]) ** 2 + (pos_a[1] - pos_b[1]) ** 2) ** 0.5
-    return dist / SPEED
+    return math.hypot(pos_a[0] - pos_b[0], pos_a[1] - pos_b[1]) / SPEED
+
+
+class PositionLog:
+    """Robot movements, recorded as the straight-line segments each robot travels.
+
+    Rather than a process sampling every robot's position once per time unit while
+    the model runs, the positions at each time unit are worked out from these
+    segments in one go once the run is over.
+    """
+
+    def __init__(self):
+        # robot name -> list of (start time, start x, start y, end x, end y, duration)
+        self.segments = {}
+
+    def add_robot(self, name):
+        """Start recording a robot's movements, returning the list its segments
+        should be appended to."""
+        return self.segments.setdefault(name, [])
+
+    def to_dataframe(self, duration):
+        """Return each robot's position at every time unit from 0 to duration as
+        position_poll events, in the same format as EventLogger."""
+        times = np.arange(duration, dtype=float)
+        frames = []
+        for name, segments in self.segments.items():
+            t0, start_x, start_y, end_x, end_y, seg_duration = np.array(segments).T
+            # The segment each robot was on at each time unit
+            idx = np.searchsorted(t0, times, side="right") - 1
+            elapsed = times - t0[idx]
+            frac = np.minimum(
+                np.divide(elapsed, seg_duration[idx], out=np.ones_like(elapsed),
+                          where=seg_duration[idx] > 0),
+                1.0
+            )
+            arrived = frac >= 1.0
+            frames.append(pd.DataFrame({
+                "entity_id": name,
+                "event_type": "position_poll",
+                "event": "position",
+                "time": times,
+                "x": np.where(arrived, end_x[idx], start_x[idx] + (end_x[idx] - start_x[idx]) * frac),
+                "y": np.where(arrived, end_y[idx], start_y[idx] + (end_y[idx] - start_y[idx]) * frac),
+            }))
+        return pd.concat(frames, ignore_index=True)
 
 
 class PackingRobot:
-    def __init__(self, env, name, logger):
+    def __init__(self, env, name, logger, position_log, rng):
         self.env = env
         self.name = name
         self.logger = logger
-        self.pos = LAYOUT["packing"]  # start at packing station
-        self.env.process(self.poll_position())
+        self.position_log = position_log
+        self._segments = position_log.add_robot(name)
+        self.rng = rng
+        self.task_times = rand_int_gen(rng, *OTHER_TASK_TIME)
+        self.other_task_draws = rand_uniform_gen(rng)
+        self._set_motion(LAYOUT["packing"], LAYOUT["packing"], 0.0)  # start at packing station
+        x, y = self.pos
         self.logger.log_arrival(entity_id=self.name,
-                                x=self.pos[0], y=self.pos[1])
+                                x=x, y=y)
         self.logger.log_queue(entity_id=self.name, event="packing",
-                               x=self.pos[0], y=self.pos[1])
+                               x=x, y=y)
 
-    def poll_position(self):
-        """Logs position every 1 sim time unit, even if idle."""
-        while True:
-            self.logger.log_custom_event(entity_id=self.name,
-                                         event_type="position_poll",
-                                         event="position",
-                                         x=self.pos[0], y=self.pos[1])
-            yield self.env.timeout(1)
+    @property
+    def pos(self):
+        """Current position, interpolated along the segment the robot is travelling."""
+        t0, start, end, duration = self._motion
+        elapsed = self.env.now - t0
+        if elapsed >= duration:
+            return end
+        frac = elapsed / duration
+        return (start[0] + (end[0] - start[0]) * frac,
+                start[1] + (end[1] - start[1]) * frac)
+
+    def _set_motion(self, start, end, duration):
+        """Start travelling in a straight line from start to end, taking duration
+        time units (a duration of 0 places the robot, stationary, at end)."""
+        self._motion = (self.env.now, start, end, duration)
+        self._segments.append((self.env.now, start[0], start[1], end[0], end[1], duration))
 
     def move_to(self, location_name, pathway, outbound=True):
         """Move robot to a location using Manhattan path.
@@ -67,33 +170,13 @@ class PackingRobot:
         outbound=False: retrace return path (vertical then horizontal)
         """
         destination = LAYOUT[location_name]
-        start_x, start_y = self.pos
-        dest_x, dest_y = destination
-
-        if outbound:
-            sequence = [("x", dest_x - start_x), ("y", dest_y - start_y)]
-        else:
-            sequence = [("y", dest_y - start_y), ("x", dest_x - start_x)]
-
-        for axis, delta in sequence:
-            if delta != 0:
-                travel_time = abs(delta) / SPEED
-                steps = int(travel_time)
-                remaining = travel_time - steps
-                move_per_unit = delta / travel_time
-
-                for _ in range(steps):
-                    yield self.env.timeout(1)
-                    if axis == "x":
-                        self.pos = (self.pos[0] + move_per_unit, self.pos[1])
-                    else:
-                        self.pos = (self.pos[0], self.pos[1] + move_per_unit)
-                if remaining > 0:
-                    yield self.env.timeout(remaining)
-                    if axis == "x":
-                        self.pos = (self.pos[0] + move_per_unit * remaining, self.pos[1])
-                    else:
-                        self.pos = (self.pos[0], self.pos[1] + move_per_unit * remaining)
+
+        # Each leg is travelled with a single timeout; positions part way along
+        # the leg are interpolated by the pos property
+        for leg_end, travel_time in plan_route(self.pos, destination, outbound):
+            self._set_motion(self.pos, leg_end, travel_time)
+            yield self.env.timeout(travel_time)
+            self._set_motion(leg_end, leg_end, 0.0)
 
 
     def pickup_packages(self, count, pickup_name):
@@ -106,29 +189,32 @@ class PackingRobot:
         yield self.env.process(self.move_to("packing", "to_packing", outbound=False))
 
 
+        x, y = self.pos
         self.logger.log_queue(entity_id=self.name,
                                     event=pickup_name,
-                                    x=self.pos[0], y=self.pos[1],
+                                    x=x, y=y,
                                     package_count=count)
-        for i in range(count):
-            yield self.env.timeout(PACKING_TIME)
+        # Nothing happens between packages, so pack the whole batch in one timeout
+        yield self.env.timeout(count * PACKING_TIME)
 
-        if random.random() < OTHER_TASK_PROB:
+        if next(self.other_task_draws) < OTHER_TASK_PROB:
             yield self.env.process(self.other_task())
 
         # Go back to the packing station
+        x, y = self.pos
         self.logger.log_queue(entity_id=self.name,
                                     event="packing",
-                                    x=self.pos[0], y=self.pos[1])
+                                    x=x, y=y)
 
 
 
     def other_task(self):
         yield self.env.process(self.move_to("maintenance", "to_maintenance"))
-        task_time = random.randint(*OTHER_TASK_TIME)
+        task_time = next(self.task_times)
+        x, y = self.pos
         self.logger.log_queue(entity_id=self.name,
                                      event="maintenance",
-                                     x=self.pos[0], y=self.pos[1],
+                                     x=x, y=y,
                                      task_duration_mins=task_time
                                      )
         yield self.env.timeout(task_time)
@@ -137,10 +223,13 @@ class PackingRobot:
 
 
 def package_arrival(env, robot):
+    inter_arrival_times = rand_int_gen(robot.rng, 4, 8)
+    batch_sizes = rand_int_gen(robot.rng, *PACKAGES_PER_BATCH)
+    pickup_indices = rand_int_gen(robot.rng, 0, len(PICKUP_POINTS) - 1)
     while True:
-        yield env.timeout(random.randint(4, 8))
-        num_packages = random.randint(*PACKAGES_PER_BATCH)
-        pickup_name = random.choice(PICKUP_POINTS)
+        yield env.timeout(next(inter_arrival_times))
+        num_packages = next(batch_sizes)
+        pickup_name = PICKUP_POINTS[next(pickup_indices)]
         yield env.process(robot.pickup_packages(num_packages, pickup_name))
 
 
@@ -149,13 +238,23 @@ def package_arrival(env, robot):
 # ---------------------------
 # Running the simulation
 # ---------------------------
-if __name__ == "__main__":
+def run_once(run_number=0):
+    """Run the model once, seeded from RANDOM_SEED and run_number, and return
+    the event log (including position polls) as a dataframe."""
     env = simpy.Environment()
     logger = EventLogger(env=env)
-    robot = PackingRobot(env, "RoboPack-1", logger)
+    rng = np.random.default_rng(RANDOM_SEED + run_number)
+    position_log = PositionLog()
+    robot = PackingRobot(env, "RoboPack-1", logger, position_log, rng)
     env.process(package_arrival(env, robot))
     env.run(until=SIM_DURATION)
+    x, y = robot.pos
     logger.log_departure(entity_id=robot.name,
-                            x=robot.pos[0], y=robot.pos[1])
+                            x=x, y=y)
 
-    logger.to_csv("robot_log.csv")
+    event_log_df = pd.concat([logger.to_dataframe(), position_log.to_dataframe(SIM_DURATION)], ignore_index=True)
+    return event_log_df.sort_values("time", kind="stable")
+
+
+if __name__ == "__main__":
+    run_once().to_csv("robot_log.csv", index=False)
@@ -1,10 +1,13 @@
-import random
+import math
+import multiprocessing
+from array import array
+from collections import deque
+from functools import lru_cache, partial
 import numpy as np
 import pandas as pd
 import simpy
 from sim_tools.distributions import Exponential, Lognormal, Uniform, Normal, Bernoulli
-from vidigi.resources import populate_store
-from examples.simulation_utility_functions import trace
+from examples.simulation_utility_functions import trace, TRACE, BatchRNG, class_settings, apply_settings
 
 
 # Class to store global parameter values.  We don't create an instance of this
@@ -73,6 +76,10 @@ class g:
 
     prob_trauma: float
         probability that a new arrival is a trauma patient.
+
+    enable_event_log: bool
+        Whether to record the event log used for the vidigi animation. Turn
+        off when only the run results are needed.
     '''
     random_number_set = 42
 
@@ -102,11 +109,20 @@ class g:
     sim_duration = 600
     number_of_runs = 100
 
+    enable_event_log = True
+
 # Class representing patients coming in to the clinic.
 class Patient:
     '''
     Class defining details for a patient entity
     '''
+    # One is created per arrival, so no per-instance __dict__
+    __slots__ = ('identifier', 'arrival', 'total_time',
+                 'wait_triage', 'wait_reg', 'wait_treat', 'wait_exam',
+                 'wait_trauma', 'triage_duration', 'reg_duration',
+                 'treat_duration', 'exam_duration', 'trauma_duration',
+                 'require_treat')
+
     def __init__(self, p_id):
         '''
         Constructor method
@@ -143,6 +159,39 @@ class Patient:
         self.trauma_duration = -np.inf
 
 
+@lru_cache(maxsize=None)
+def load_arrival_profile(path):
+    '''
+    Read the hourly arrival profile, along with the mean inter-arrival time
+    for each hour.
+
+    Every run uses the same profile, so it is only read from disk once per
+    process; the dataframe returned is shared between runs and shouldn't be
+    modified.
+    '''
+    arrivals = pd.read_csv(path)
+    arrivals['mean_iat'] = 60 / arrivals['arrival_rate']
+    return arrivals
+
+
+def recorded_values(patients, attribute):
+    '''
+    Gather one attribute across a list of patients into an array, keeping only
+    the patients who got far enough through their pathway for it to be
+    recorded (attributes start at -np.inf)
+    '''
+    values = np.fromiter((getattr(p, attribute) for p in patients),
+                         dtype=np.float64, count=len(patients))
+    return values[values > -np.inf]
+
+
+def safe_mean(values):
+    '''
+    Mean of an array, or NaN if it is empty
+    '''
+    return values.mean() if values.size else np.nan
+
+
 # Class representing our model of the clinic.
 class Model:
     '''
@@ -158,7 +207,18 @@ class Model:
         # Create a SimPy environment in which everything will live
         self.env = simpy.Environment()
 
-        self.event_log = []
+        # Event log columns (missing resource IDs are NaN)
+        self._ev_patient = array('q')
+        self._ev_pathway = []
+        self._ev_event = []
+        self._ev_event_type = []
+        self._ev_time = array('d')
+        self._ev_resource_id = array('d')
+
+        # With the event log turned off (g.enable_event_log), events are
+        # dropped as they come in rather than being recorded
+        if not g.enable_event_log:
+            self._log_event = self._discard_event
 
         # Create a patient counter (which we'll use as a patient ID)
         self.patient_counter = 0
@@ -172,75 +232,127 @@ class Model:
         # Store the passed in run number
         self.run_number = run_number
 
-        # Create a new Pandas DataFrame that will store some results against
-        # the patient ID (which we'll use as the index).
-        self.results_df = pd.DataFrame()
-        self.results_df["Patient ID"] = [1]
-        self.results_df["Queue Time Cubicle"] = [0.0]
-        self.results_df["Time with Nurse"] = [0.0]
-        self.results_df.set_index("Patient ID", inplace=True)
+        # Create attributes to store the number of arrivals and the mean
+        # queuing time for a treatment cubicle across this run of the model
+        self.arrivals_count = 0
+        self.mean_q_time_cubicle = 0.0
 
-        # Create an attribute to store the mean queuing times across this run of
-        # the model
-        self.mean_q_time_cubicle = 0
+        # Each distribution gets its own independent stream of random numbers,
+        # spawned from this run's seed (giving them all the same seed would
+        # make their samples correlated)
+        self.seeds = np.random.SeedSequence(self.run_number*g.random_number_set).spawn(10)
 
         # create distributions
 
         # Triage duration
-        self.triage_dist = Exponential(g.triage_mean,
-                                       random_seed=self.run_number*g.random_number_set)
+        self.triage_dist = BatchRNG(Exponential(g.triage_mean,
+                                                random_seed=self.seeds[0]))
 
         # Registration duration (non-trauma only)
-        self.reg_dist = Lognormal(g.reg_mean,
-                                  np.sqrt(g.reg_var),
-                                  random_seed=self.run_number*g.random_number_set)
+        self.reg_dist = BatchRNG(Lognormal(g.reg_mean,
+                                           math.sqrt(g.reg_var),
+                                           random_seed=self.seeds[1]))
 
         # Evaluation (non-trauma only)
-        self.exam_dist = Normal(g.exam_mean,
-                                np.sqrt(g.exam_var),
-                                random_seed=self.run_number*g.random_number_set)
+        self.exam_dist = BatchRNG(Normal(g.exam_mean,
+                                         math.sqrt(g.exam_var),
+                                         random_seed=self.seeds[2]))
 
         # Trauma/stablisation duration (trauma only)
-        self.trauma_dist = Exponential(g.trauma_mean,
-                                       random_seed=self.run_number*g.random_number_set)
+        self.trauma_dist = BatchRNG(Exponential(g.trauma_mean,
+                                                random_seed=self.seeds[3]))
 
         # Non-trauma treatment
-        self.nt_treat_dist = Lognormal(g.non_trauma_treat_mean,
-                                       np.sqrt(g.non_trauma_treat_var),
-                                       random_seed=self.run_number*g.random_number_set)
+        self.nt_treat_dist = BatchRNG(Lognormal(g.non_trauma_treat_mean,
+                                                math.sqrt(g.non_trauma_treat_var),
+                                                random_seed=self.seeds[4]))
 
         # treatment of trauma patients
-        self.treat_dist = Lognormal(g.trauma_treat_mean,
-                                    np.sqrt(g.non_trauma_treat_var),
-                                    random_seed=self.run_number*g.random_number_set)
+        self.treat_dist = BatchRNG(Lognormal(g.trauma_treat_mean,
+                                             math.sqrt(g.trauma_treat_var),
+                                             random_seed=self.seeds[5]))
 
         # probability of non-trauma patient requiring treatment
-        self.nt_p_treat_dist = Bernoulli(g.non_trauma_treat_p,
-                                         random_seed=self.run_number*g.random_number_set)
+        self.nt_p_treat_dist = BatchRNG(Bernoulli(g.non_trauma_treat_p,
+                                                  random_seed=self.seeds[6]))
 
         # probability of non-trauma versus trauma patient
-        self.p_trauma_dist = Bernoulli(g.prob_trauma,
-                                       random_seed=self.run_number*g.random_number_set)
+        self.p_trauma_dist = BatchRNG(Bernoulli(g.prob_trauma,
+                                                random_seed=self.seeds[7]))
 
         # init sampling for non-stationary poisson process
         self.init_nspp()
 
+    def _log_event(self, patient, pathway, event_type, event, time,
+                   resource_id=None):
+        '''
+        Record an event in the columns of the event log
+        '''
+        self._ev_patient.append(patient)
+        self._ev_pathway.append(pathway)
+        self._ev_event.append(event)
+        self._ev_event_type.append(event_type)
+        self._ev_time.append(time)
+        self._ev_resource_id.append(np.nan if resource_id is None else resource_id)
+
+    def _discard_event(self, *args, **kwargs):
+        '''
+        Stands in for _log_event when the event log is turned off
+        '''
+
     def init_nspp(self):
 
-        # read arrival profile
-        self.arrivals = pd.read_csv(g.arrival_df)  # pylint: disable=attribute-defined-outside-init
-        self.arrivals['mean_iat'] = 60 / self.arrivals['arrival_rate']
+        # read arrival profile (shared between runs in the same process)
+        self.arrivals = load_arrival_profile(g.arrival_df)  # pylint: disable=attribute-defined-outside-init
+
+        # hourly arrival rates as a plain array, so they can be indexed directly
+        self.arrival_rates = self.arrivals['arrival_rate'].to_numpy()  # pylint: disable=attribute-defined-outside-init
 
         # maximum arrival rate (smallest time between arrivals)
-        self.lambda_max = self.arrivals['arrival_rate'].max()  # pylint: disable=attribute-defined-outside-init
+        self.lambda_max = self.arrival_rates.max()  # pylint: disable=attribute-defined-outside-init
+
+        # probability of accepting a candidate arrival in each hour of the
+        # profile (lambda_t / lambda_max), worked out once per hour rather
+        # than once per candidate
+        self.p_accept = self.arrival_rates / self.lambda_max  # pylint: disable=attribute-defined-outside-init
 
         # thinning exponential
         self.arrival_dist = Exponential(60.0 / self.lambda_max,  # pylint: disable=attribute-defined-outside-init
-                                            random_seed=self.run_number*g.random_number_set)
+                                            random_seed=self.seeds[8])
 
         # thinning uniform rng
         self.thinning_rng = Uniform(low=0.0, high=1.0,  # pylint: disable=attribute-defined-outside-init
-                                    random_seed=self.run_number*g.random_number_set)
+                                    random_seed=self.seeds[9])
+
+    def sample_arrival_times(self):
+        '''
+        Sample the arrival time of every patient in the run up front, by
+        thinning a stationary poisson process that runs at the maximum
+        arrival rate.
+
+        Each candidate is accepted using the arrival rate for the hour it
+        falls in. Earlier versions of this model used the rate for the hour
+        of the previous arrival, so the arrivals differ from theirs.
+
+        Returns:
+        -----
+        np.ndarray of arrival times, in ascending order
+        '''
+        # candidate arrivals at the maximum rate - keep drawing until they
+        # cover the whole run
+        n_expected = int(self.lambda_max / 60 * g.sim_duration * 1.5) + 10
+        candidates = self.arrival_dist.sample(n_expected).cumsum()
+        while candidates[-1] < g.sim_duration:
+            candidates = np.concatenate(
+                [candidates,
+                 candidates[-1] + self.arrival_dist.sample(n_expected).cumsum()]
+            )
+        candidates = candidates[candidates < g.sim_duration]
+
+        # reject candidates if u >= lambda_t / lambda_max
+        hour = (candidates // 60).astype(int) % len(self.p_accept)
+        u = self.thinning_rng.sample(candidates.size)
+        return candidates[u < self.p_accept[hour]]
 
 
     def init_resources(self):
@@ -252,57 +364,39 @@ class Model:
             1. Nurses/treatment bays (same thing in this model)
 
         '''
+        # Each pool is a simpy Resource, which only needs to count how many of
+        # its resources are in use.  Alongside it is a queue of the IDs of its
+        # free resources, so the one a patient is using can be logged.
+
         # Shared Resources
-        self.triage_cubicles = simpy.Store(self.env)
-        populate_store(num_resources=g.n_triage,
-                simpy_store=self.triage_cubicles,
-                sim_env=self.env)
+        self.triage_cubicles = simpy.Resource(self.env, capacity=g.n_triage)
+        self.triage_cubicles_free_ids = deque(range(1, g.n_triage + 1))
 
-        self.registration_cubicles = simpy.Store(self.env)
-        populate_store(num_resources=g.n_reg,
-                       simpy_store=self.registration_cubicles,
-                       sim_env=self.env)
+        self.registration_cubicles = simpy.Resource(self.env, capacity=g.n_reg)
+        self.registration_cubicles_free_ids = deque(range(1, g.n_reg + 1))
 
         # Non-trauma
-        self.exam_cubicles = simpy.Store(self.env)
-        populate_store(num_resources=g.n_exam,
-                       simpy_store=self.exam_cubicles,
-                       sim_env=self.env)
+        self.exam_cubicles = simpy.Resource(self.env, capacity=g.n_exam)
+        self.exam_cubicles_free_ids = deque(range(1, g.n_exam + 1))
 
-        self.non_trauma_treatment_cubicles = simpy.Store(self.env)
-        populate_store(num_resources=g.n_cubicles_non_trauma_treat,
-                       simpy_store=self.non_trauma_treatment_cubicles,
-                       sim_env=self.env)
+        self.non_trauma_treatment_cubicles = simpy.Resource(self.env, capacity=g.n_cubicles_non_trauma_treat)
+        self.non_trauma_treatment_cubicles_free_ids = deque(range(1, g.n_cubicles_non_trauma_treat + 1))
 
         # Trauma
-        self.trauma_stabilisation_bays = simpy.Store(self.env)
-        populate_store(num_resources=g.n_trauma,
-                       simpy_store=self.trauma_stabilisation_bays,
-                       sim_env=self.env)
+        self.trauma_stabilisation_bays = simpy.Resource(self.env, capacity=g.n_trauma)
+        self.trauma_stabilisation_bays_free_ids = deque(range(1, g.n_trauma + 1))
 
-        self.trauma_treatment_cubicles = simpy.Store(self.env)
-        populate_store(num_resources=g.n_cubicles_trauma_treat,
-                       simpy_store=self.trauma_treatment_cubicles,
-                       sim_env=self.env)
+        self.trauma_treatment_cubicles = simpy.Resource(self.env, capacity=g.n_cubicles_trauma_treat)
+        self.trauma_treatment_cubicles_free_ids = deque(range(1, g.n_cubicles_trauma_treat + 1))
 
     # A generator function that represents the DES generator for patient
     # arrivals
     def generator_patient_arrivals(self):
-        # We use an infinite loop here to keep doing this indefinitely whilst
-        # the simulation runs
-        while True:
-            t = int(self.env.now // 60) % self.arrivals.shape[0]
-            lambda_t = self.arrivals['arrival_rate'].iloc[t]
-
-            # set to a large number so that at least 1 sample taken!
-            u = np.Inf
-
-            interarrival_time = 0.0
-            # reject samples if u >= lambda_t / lambda_max
-            while u >= (lambda_t / self.lambda_max):
-                interarrival_time += self.arrival_dist.sample()
-                u = self.thinning_rng.sample()
+        # The arrival times don't depend on anything that happens in the model,
+        # so they are all sampled before the first patient arrives
+        interarrival_times = np.diff(self.sample_arrival_times(), prepend=0.0)
 
+        for interarrival_time in interarrival_times.tolist():
             # Freeze this instance of this function in place until the
             # inter-arrival time we sampled above has elapsed.  Note - time in
             # SimPy progresses in "Time Units", which can represent anything
@@ -318,14 +412,11 @@ class Model:
             # patient - so here we pass the patient counter to use as the ID.
             p = Patient(self.patient_counter)
 
-            trace(f'patient {self.patient_counter} arrives at: {self.env.now:.3f}')
-            self.event_log.append(
-                {'patient': self.patient_counter,
-                 'pathway': 'Shared',
-                 'event': 'arrival',
-                 'event_type': 'arrival_departure',
-                 'time': self.env.now}
-            )
+            if TRACE:
+                trace(f'patient {self.patient_counter} arrives at: {self.env.now:.3f}')
+            self._log_event(patient=self.patient_counter, pathway='Shared',
+                            event_type='arrival_departure', event='arrival',
+                            time=self.env.now)
 
             # sample if the patient is trauma or non-trauma
             trauma = self.p_trauma_dist.sample()
@@ -358,220 +449,187 @@ class Model:
         4a. percentage discharged
         4b. remaining percentage treatment then discharge
         '''
+        # Local names for the things looked up at every step of the pathway;
+        # env.now only changes when the pathway yields, so it is read once
+        # after each yield
+        env = self.env
+        log_event = self._log_event
+        pid = patient.identifier
+        now = env.now
+
         # record the time of arrival and entered the triage queue
-        patient.arrival = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Non-Trauma',
-             'event_type': 'queue',
-             'event': 'triage_wait_begins',
-             'time': self.env.now}
-        )
+        patient.arrival = now
+        log_event(patient=pid, pathway='Non-Trauma', event_type='queue',
+                  event='triage_wait_begins', time=now)
 
         ###################################################
         # request sign-in/triage
-        triage_resource = yield self.triage_cubicles.get()
+        triage_req = self.triage_cubicles.request()
+        yield triage_req
+        now = env.now
+        triage_resource_id = self.triage_cubicles_free_ids.popleft()
 
         # record the waiting time for triage
-        patient.wait_triage = self.env.now - patient.arrival
-        trace(f'patient {patient.identifier} triaged to minors '
-                f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event_type': 'resource_use',
-                'event': 'triage_begins',
-                'time': self.env.now,
-                'resource_id': triage_resource.id_attribute
-                }
-        )
+        patient.wait_triage = now - patient.arrival
+        if TRACE:
+            trace(f'patient {pid} triaged to minors '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma', event_type='resource_use',
+                  event='triage_begins', time=now,
+                  resource_id=triage_resource_id)
 
         # sample triage duration.
         patient.triage_duration = self.triage_dist.sample()
-        yield self.env.timeout(patient.triage_duration)
-
-        trace(f'triage {patient.identifier} complete {self.env.now:.3f}; '
-                f'waiting time was {patient.wait_triage:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event_type': 'resource_use_end',
-                'event': 'triage_complete',
-                'time': self.env.now,
-                'resource_id': triage_resource.id_attribute}
-        )
-
-        # Resource is no longer in use, so put it back in the store
-        self.triage_cubicles.put(triage_resource)
+        yield env.timeout(patient.triage_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'triage {pid} complete {now:.3f}; '
+                  f'waiting time was {patient.wait_triage:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma',
+                  event_type='resource_use_end', event='triage_complete',
+                  time=now, resource_id=triage_resource_id)
+
+        # Resource is no longer in use, so release it and free up its ID
+        self.triage_cubicles_free_ids.append(triage_resource_id)
+        self.triage_cubicles.release(triage_req)
         #########################################################
 
         # record the time that entered the registration queue
-        start_wait = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Non-Trauma',
-             'event_type': 'queue',
-             'event': 'MINORS_registration_wait_begins',
-             'time': self.env.now}
-        )
+        start_wait = now
+        log_event(patient=pid, pathway='Non-Trauma', event_type='queue',
+                  event='MINORS_registration_wait_begins', time=now)
 
         #########################################################
         # request registration clerk
-        registration_resource = yield self.registration_cubicles.get()
+        registration_req = self.registration_cubicles.request()
+        yield registration_req
+        now = env.now
+        registration_resource_id = self.registration_cubicles_free_ids.popleft()
 
         # record the waiting time for registration
-        patient.wait_reg = self.env.now - start_wait
-        trace(f'registration of patient {patient.identifier} at '
-                f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event_type': 'resource_use',
-                'event': 'MINORS_registration_begins',
-                'time': self.env.now,
-                'resource_id': registration_resource.id_attribute
-                }
-        )
+        patient.wait_reg = now - start_wait
+        if TRACE:
+            trace(f'registration of patient {pid} at '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma', event_type='resource_use',
+                  event='MINORS_registration_begins', time=now,
+                  resource_id=registration_resource_id)
 
         # sample registration duration.
         patient.reg_duration = self.reg_dist.sample()
-        yield self.env.timeout(patient.reg_duration)
-
-        trace(f'patient {patient.identifier} registered at'
-                f'{self.env.now:.3f}; '
-                f'waiting time was {patient.wait_reg:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event': 'MINORS_registration_complete',
-                'event_type': 'resource_use_end',
-                'time': self.env.now,
-                'resource_id': registration_resource.id_attribute}
-        )
-        # Resource is no longer in use, so put it back in the store
-        self.registration_cubicles.put(registration_resource)
+        yield env.timeout(patient.reg_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'patient {pid} registered at'
+                  f'{now:.3f}; '
+                  f'waiting time was {patient.wait_reg:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma',
+                  event_type='resource_use_end',
+                  event='MINORS_registration_complete', time=now,
+                  resource_id=registration_resource_id)
+        # Resource is no longer in use, so release it and free up its ID
+        self.registration_cubicles_free_ids.append(registration_resource_id)
+        self.registration_cubicles.release(registration_req)
         ########################################################
 
         # record the time that entered the evaluation queue
-        start_wait = self.env.now
+        start_wait = now
 
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Non-Trauma',
-             'event': 'MINORS_examination_wait_begins',
-             'event_type': 'queue',
-             'time': self.env.now}
-        )
+        log_event(patient=pid, pathway='Non-Trauma', event_type='queue',
+                  event='MINORS_examination_wait_begins', time=now)
 
         #########################################################
         # request examination resource
-        examination_resource = yield self.exam_cubicles.get()
+        examination_req = self.exam_cubicles.request()
+        yield examination_req
+        now = env.now
+        examination_resource_id = self.exam_cubicles_free_ids.popleft()
 
         # record the waiting time for examination to begin
-        patient.wait_exam = self.env.now - start_wait
-        trace(f'examination of patient {patient.identifier} begins '
-                f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event': 'MINORS_examination_begins',
-                'event_type': 'resource_use',
-                'time': self.env.now,
-                'resource_id': examination_resource.id_attribute
-                }
-        )
+        patient.wait_exam = now - start_wait
+        if TRACE:
+            trace(f'examination of patient {pid} begins '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma', event_type='resource_use',
+                  event='MINORS_examination_begins', time=now,
+                  resource_id=examination_resource_id)
 
         # sample examination duration.
         patient.exam_duration = self.exam_dist.sample()
-        yield self.env.timeout(patient.exam_duration)
-
-        trace(f'patient {patient.identifier} examination complete '
-                f'at {self.env.now:.3f};'
-                f'waiting time was {patient.wait_exam:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Non-Trauma',
-                'event': 'MINORS_examination_complete',
-                'event_type': 'resource_use_end',
-                'time': self.env.now,
-                'resource_id': examination_resource.id_attribute}
-        )
-        # Resource is no longer in use, so put it back in
-        self.exam_cubicles.put(examination_resource)
+        yield env.timeout(patient.exam_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'patient {pid} examination complete '
+                  f'at {now:.3f};'
+                  f'waiting time was {patient.wait_exam:.3f}')
+        log_event(patient=pid, pathway='Non-Trauma',
+                  event_type='resource_use_end',
+                  event='MINORS_examination_complete', time=now,
+                  resource_id=examination_resource_id)
+        # Resource is no longer in use, so release it and free up its ID
+        self.exam_cubicles_free_ids.append(examination_resource_id)
+        self.exam_cubicles.release(examination_req)
         ############################################################################
 
         # sample if patient requires treatment?
-        patient.require_treat = self.nt_p_treat_dist.sample()  #pylint: disable=attribute-defined-outside-init
+        patient.require_treat = self.nt_p_treat_dist.sample()
 
         if patient.require_treat:
 
-            self.event_log.append(
-                {'patient': patient.identifier,
-                 'pathway': 'Non-Trauma',
-                 'event': 'requires_treatment',
-                 'event_type': 'attribute_assigned',
-                 'time': self.env.now}
-            )
+            log_event(patient=pid, pathway='Non-Trauma',
+                      event_type='attribute_assigned',
+                      event='requires_treatment', time=now)
 
             # record the time that entered the treatment queue
-            start_wait = self.env.now
-            self.event_log.append(
-                {'patient': patient.identifier,
-                 'pathway': 'Non-Trauma',
-                 'event': 'MINORS_treatment_wait_begins',
-                 'event_type': 'queue',
-                 'time': self.env.now}
-            )
+            start_wait = now
+            log_event(patient=pid, pathway='Non-Trauma', event_type='queue',
+                      event='MINORS_treatment_wait_begins', time=now)
             ###################################################
             # request treatment cubicle
 
-            non_trauma_treatment_resource = yield self.non_trauma_treatment_cubicles.get()
+            non_trauma_treatment_req = self.non_trauma_treatment_cubicles.request()
+            yield non_trauma_treatment_req
+            now = env.now
+            non_trauma_treatment_resource_id = self.non_trauma_treatment_cubicles_free_ids.popleft()
 
             # record the waiting time for treatment
-            patient.wait_treat = self.env.now - start_wait
-            trace(f'treatment of patient {patient.identifier} begins '
-                    f'{self.env.now:.3f}')
-            self.event_log.append(
-                {'patient': patient.identifier,
-                    'pathway': 'Non-Trauma',
-                    'event': 'MINORS_treatment_begins',
-                    'event_type': 'resource_use',
-                    'time': self.env.now,
-                    'resource_id': non_trauma_treatment_resource.id_attribute
-                }
-            )
+            patient.wait_treat = now - start_wait
+            if TRACE:
+                trace(f'treatment of patient {pid} begins '
+                      f'{now:.3f}')
+            log_event(patient=pid, pathway='Non-Trauma',
+                      event_type='resource_use',
+                      event='MINORS_treatment_begins', time=now,
+                      resource_id=non_trauma_treatment_resource_id)
 
             # sample treatment duration.
             patient.treat_duration = self.nt_treat_dist.sample()
-            yield self.env.timeout(patient.treat_duration)
-
-            trace(f'patient {patient.identifier} treatment complete '
-                    f'at {self.env.now:.3f};'
-                    f'waiting time was {patient.wait_treat:.3f}')
-            self.event_log.append(
-                {'patient': patient.identifier,
-                    'pathway': 'Non-Trauma',
-                    'event': 'MINORS_treatment_complete',
-                    'event_type': 'resource_use_end',
-                    'time': self.env.now,
-                    'resource_id': non_trauma_treatment_resource.id_attribute}
-            )
-
-            # Resource is no longer in use, so put it back in the store
-            self.non_trauma_treatment_cubicles.put(non_trauma_treatment_resource)
+            yield env.timeout(patient.treat_duration)
+            now = env.now
+
+            if TRACE:
+                trace(f'patient {pid} treatment complete '
+                      f'at {now:.3f};'
+                      f'waiting time was {patient.wait_treat:.3f}')
+            log_event(patient=pid, pathway='Non-Trauma',
+                      event_type='resource_use_end',
+                      event='MINORS_treatment_complete', time=now,
+                      resource_id=non_trauma_treatment_resource_id)
+
+            # Resource is no longer in use, so release it and free up its ID
+            self.non_trauma_treatment_cubicles_free_ids.append(non_trauma_treatment_resource_id)
+            self.non_trauma_treatment_cubicles.release(non_trauma_treatment_req)
         ##########################################################################
 
         # Return to what happens to all patients, regardless of whether they were sampled as needing treatment
-        self.event_log.append(
-            {'patient': patient.identifier,
-            'pathway': 'Shared',
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
+        log_event(patient=pid, pathway='Shared', event_type='arrival_departure',
+                  event='depart', time=now)
 
         # total time in system
-        patient.total_time = self.env.now - patient.arrival
+        patient.total_time = now - patient.arrival
 
     def attend_trauma_pathway(self, patient):
         '''
@@ -581,170 +639,160 @@ class Model:
         2. trauma
         3. treatment
         '''
+        # Local names for the things looked up at every step of the pathway;
+        # env.now only changes when the pathway yields, so it is read once
+        # after each yield
+        env = self.env
+        log_event = self._log_event
+        pid = patient.identifier
+        now = env.now
+
         # record the time of arrival and entered the triage queue
-        patient.arrival = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'queue',
-             'event': 'triage_wait_begins',
-             'time': self.env.now}
-        )
+        patient.arrival = now
+        log_event(patient=pid, pathway='Trauma', event_type='queue',
+                  event='triage_wait_begins', time=now)
 
         ###################################################
         # request sign-in/triage
-        triage_resource = yield self.triage_cubicles.get()
+        triage_req = self.triage_cubicles.request()
+        yield triage_req
+        now = env.now
+        triage_resource_id = self.triage_cubicles_free_ids.popleft()
 
         # record the waiting time for triage
-        patient.wait_triage = self.env.now - patient.arrival
-
-        trace(f'patient {patient.identifier} triaged to trauma '
-                f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'resource_use',
-             'event': 'triage_begins',
-             'time': self.env.now,
-             'resource_id': triage_resource.id_attribute
-            }
-        )
+        patient.wait_triage = now - patient.arrival
+
+        if TRACE:
+            trace(f'patient {pid} triaged to trauma '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use',
+                  event='triage_begins', time=now,
+                  resource_id=triage_resource_id)
 
         # sample triage duration.
         patient.triage_duration = self.triage_dist.sample()
-        yield self.env.timeout(patient.triage_duration)
-
-        trace(f'triage {patient.identifier} complete {self.env.now:.3f}; '
-              f'waiting time was {patient.wait_triage:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'resource_use_end',
-             'event': 'triage_complete',
-             'time': self.env.now,
-             'resource_id': triage_resource.id_attribute}
-        )
-
-        # Resource is no longer in use, so put it back in the store
-        self.triage_cubicles.put(triage_resource)
+        yield env.timeout(patient.triage_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'triage {pid} complete {now:.3f}; '
+                  f'waiting time was {patient.wait_triage:.3f}')
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use_end',
+                  event='triage_complete', time=now,
+                  resource_id=triage_resource_id)
+
+        # Resource is no longer in use, so release it and free up its ID
+        self.triage_cubicles_free_ids.append(triage_resource_id)
+        self.triage_cubicles.release(triage_req)
         ###################################################
 
         # record the time that entered the trauma queue
-        start_wait = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'queue',
-             'event': 'TRAUMA_stabilisation_wait_begins',
-             'time': self.env.now}
-        )
+        start_wait = now
+        log_event(patient=pid, pathway='Trauma', event_type='queue',
+                  event='TRAUMA_stabilisation_wait_begins', time=now)
 
         ###################################################
         # request trauma room
-        trauma_resource = yield self.trauma_stabilisation_bays.get()
-
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Trauma',
-                'event_type': 'resource_use',
-                'event': 'TRAUMA_stabilisation_begins',
-                'time': self.env.now,
-                'resource_id': trauma_resource.id_attribute
-                }
-        )
+        trauma_req = self.trauma_stabilisation_bays.request()
+        yield trauma_req
+        now = env.now
+        trauma_resource_id = self.trauma_stabilisation_bays_free_ids.popleft()
+
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use',
+                  event='TRAUMA_stabilisation_begins', time=now,
+                  resource_id=trauma_resource_id)
 
         # record the waiting time for trauma
-        patient.wait_trauma = self.env.now - start_wait
+        patient.wait_trauma = now - start_wait
 
         # sample stablisation duration.
         patient.trauma_duration = self.trauma_dist.sample()
-        yield self.env.timeout(patient.trauma_duration)
-
-        trace(f'stabilisation of patient {patient.identifier} at '
-              f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'resource_use_end',
-             'event': 'TRAUMA_stabilisation_complete',
-             'time': self.env.now,
-             'resource_id': trauma_resource.id_attribute
-            }
-        )
-        # Resource is no longer in use, so put it back in the store
-        self.trauma_stabilisation_bays.put(trauma_resource)
+        yield env.timeout(patient.trauma_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'stabilisation of patient {pid} at '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use_end',
+                  event='TRAUMA_stabilisation_complete', time=now,
+                  resource_id=trauma_resource_id)
+        # Resource is no longer in use, so release it and free up its ID
+        self.trauma_stabilisation_bays_free_ids.append(trauma_resource_id)
+        self.trauma_stabilisation_bays.release(trauma_req)
 
         #######################################################
 
         # record the time that patient entered the treatment queue
-        start_wait = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'queue',
-             'event': 'TRAUMA_treatment_wait_begins',
-             'time': self.env.now}
-        )
+        start_wait = now
+        log_event(patient=pid, pathway='Trauma', event_type='queue',
+                  event='TRAUMA_treatment_wait_begins', time=now)
 
         ########################################################
         # request treatment cubicle
-        trauma_treatment_resource = yield self.trauma_treatment_cubicles.get()
+        trauma_treatment_req = self.trauma_treatment_cubicles.request()
+        yield trauma_treatment_req
+        now = env.now
+        trauma_treatment_resource_id = self.trauma_treatment_cubicles_free_ids.popleft()
 
         # record the waiting time for trauma
-        patient.wait_treat = self.env.now - start_wait
-        trace(f'treatment of patient {patient.identifier} at '
-                f'{self.env.now:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': 'Trauma',
-                'event_type': 'resource_use',
-                'event': 'TRAUMA_treatment_begins',
-                'time': self.env.now,
-                'resource_id': trauma_treatment_resource.id_attribute
-                }
-        )
+        patient.wait_treat = now - start_wait
+        if TRACE:
+            trace(f'treatment of patient {pid} at '
+                  f'{now:.3f}')
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use',
+                  event='TRAUMA_treatment_begins', time=now,
+                  resource_id=trauma_treatment_resource_id)
 
         # sample treatment duration.
-        patient.treat_duration = self.trauma_dist.sample()
-        yield self.env.timeout(patient.treat_duration)
-
-        trace(f'patient {patient.identifier} treatment complete {self.env.now:.3f}; '
-              f'waiting time was {patient.wait_treat:.3f}')
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Trauma',
-             'event_type': 'resource_use_end',
-             'event': 'TRAUMA_treatment_complete',
-             'time': self.env.now,
-             'resource_id': trauma_treatment_resource.id_attribute}
-        )
-        self.event_log.append(
-            {'patient': patient.identifier,
-            'pathway': 'Shared',
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
-
-        # Resource is no longer in use, so put it back in the store
-        self.trauma_treatment_cubicles.put(trauma_treatment_resource)
+        patient.treat_duration = self.treat_dist.sample()
+        yield env.timeout(patient.treat_duration)
+        now = env.now
+
+        if TRACE:
+            trace(f'patient {pid} treatment complete {now:.3f}; '
+                  f'waiting time was {patient.wait_treat:.3f}')
+        log_event(patient=pid, pathway='Trauma', event_type='resource_use_end',
+                  event='TRAUMA_treatment_complete', time=now,
+                  resource_id=trauma_treatment_resource_id)
+        log_event(patient=pid, pathway='Shared', event_type='arrival_departure',
+                  event='depart', time=now)
+
+        # Resource is no longer in use, so release it and free up its ID
+        self.trauma_treatment_cubicles_free_ids.append(trauma_treatment_resource_id)
+        self.trauma_treatment_cubicles.release(trauma_treatment_req)
 
         #########################################################
 
         # total time in system
-        patient.total_time = self.env.now - patient.arrival
+        patient.total_time = now - patient.arrival
 
 
-    # This method calculates results over a single run.  Here we just calculate
-    # a mean, but in real world models you'd probably want to calculate more.
+    # This method calculates results over a single run.
     def calculate_run_results(self):
-        # Take the mean of the queuing times across patients in this run of the
-        # model.
-        self.mean_q_time_cubicle = self.results_df["Queue Time Cubicle"].mean()
-
-    # The run method starts up the DES entity generators, runs the simulation,
-    # and in turns calls anything we need to generate results for the run
-    def run(self):
+        # Patient-level KPIs.  Each patient attribute is pulled out into an
+        # array once and summarised with numpy, rather than being worked out
+        # from the event log.
+        all_patients = self.non_trauma_patients + self.trauma_patients
+        total_time = recorded_values(all_patients, 'total_time')
+
+        self.run_kpis = {
+            'mean_wait_triage': safe_mean(recorded_values(all_patients, 'wait_triage')),
+            'mean_wait_reg': safe_mean(recorded_values(self.non_trauma_patients, 'wait_reg')),
+            'mean_wait_exam': safe_mean(recorded_values(self.non_trauma_patients, 'wait_exam')),
+            'mean_wait_trauma': safe_mean(recorded_values(self.trauma_patients, 'wait_trauma')),
+            'mean_wait_treat': safe_mean(recorded_values(all_patients, 'wait_treat')),
+            'mean_total_time': safe_mean(total_time),
+            'p95_total_time': np.percentile(total_time, 95) if total_time.size else np.nan,
+        }
+
+        self.arrivals_count = len(all_patients)
+        # Take the mean of the queuing times for a treatment cubicle across
+        # patients in this run of the model.
+        self.mean_q_time_cubicle = float(self.run_kpis['mean_wait_treat'])
+
+    # Starts up the DES entity generators, runs the simulation, and in turn
+    # calls anything we need to generate results for the run
+    def _run_simulation(self):
         # Start up our DES entity generators that create new patients.  We've
         # only got one in this model, but we'd need to do this for each one if
         # we had multiple generators.
@@ -757,48 +805,118 @@ class Model:
         # run results
         self.calculate_run_results()
 
-        self.event_log = pd.DataFrame(self.event_log)
+    def _event_log_columns(self):
+        '''
+        Return the run's event log as a dict of column arrays, each given its
+        dtype up front.  Trial joins these up across runs before making a
+        single dataframe, rather than making one per run.
+        '''
+        return {
+            'patient': np.asarray(self._ev_patient, dtype=np.int64),
+            'pathway': np.array(self._ev_pathway, dtype=object),
+            'event': np.array(self._ev_event, dtype=object),
+            'event_type': np.array(self._ev_event_type, dtype=object),
+            'time': np.asarray(self._ev_time, dtype=np.float64),
+            'resource_id': np.asarray(self._ev_resource_id, dtype=np.float64),
+            'run': np.full(len(self._ev_time), self.run_number),
+        }
+
+    # The run method carries out the run and hands back its results and its
+    # event log as a dataframe
+    def run(self):
+        self._run_simulation()
 
-        self.event_log["run"] = self.run_number
+        self.event_log = pd.DataFrame(self._event_log_columns())
 
-        return {'results': self.results_df, 'event_log': self.event_log}
+        return {'results': {'Arrivals': self.arrivals_count,
+                            'Mean Queue Time Cubicle': self.mean_q_time_cubicle},
+                'kpis': self.run_kpis,
+                'event_log': self.event_log}
+
+# Function that carries out a single run of the model.  This lives outside of
+# the Trial class so that it can be sent to other processes to run in parallel.
+def execute_run(run_number, settings=None):
+    '''
+    Run the model once
+
+    Params:
+    -----
+    run_number: int
+        The run number, which is also used to seed the model's distributions
+
+    settings: dict, optional
+        Values to set on the g class before the run, from class_settings(g)
+
+    Returns:
+    -----
+    tuple of (number of arrivals, mean queue time for a cubicle,
+    event log as a dict of column arrays)
+    '''
+    if settings is not None:
+        apply_settings(g, settings)
+
+    my_model = Model(run_number)
+    my_model._run_simulation()
+
+    return (my_model.arrivals_count, my_model.mean_q_time_cubicle,
+            my_model._event_log_columns())
 
 # Class representing a Trial for our simulation - a batch of simulation runs.
 class Trial:
-    # The constructor sets up a pandas dataframe that will store the key
+    # The constructor sets up an empty pandas dataframe that will store the key
     # results from each run against run number, with run number as the index.
     def  __init__(self):
-        self.df_trial_results = pd.DataFrame()
-        self.df_trial_results["Run Number"] = [0]
-        self.df_trial_results["Arrivals"] = [0]
-        self.df_trial_results["Mean Queue Time Cubicle"] = [0.0]
-        self.df_trial_results.set_index("Run Number", inplace=True)
+        self.df_trial_results = pd.DataFrame(
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
         self.all_event_logs = []
 
     # Method to run a trial
-    def run_trial(self):
+    def run_trial(self, n_jobs=1):
+        '''
+        Run the model g.number_of_runs times
+
+        Params:
+        -----
+        n_jobs: int or None, optional
+            Number of processes to spread the runs across. Defaults to 1, which
+            carries out the runs one after another in this process; pass None
+            for one per CPU core.
+        '''
         # Run the simulation for the number of runs specified in g class.
-        # For each run, we create a new instance of the Model class and call its
-        # run method, which sets everything else in motion.  Once the run has
-        # completed, we grab out the stored run results (just mean queuing time
-        # here) and store it against the run number in the trial results
+        # Each run creates a new instance of the Model class and calls its
+        # run method, which sets everything else in motion.  The runs don't
+        # share any state, so they can be carried out in parallel.  Once they
+        # have completed, we grab out the stored run results (just mean queuing
+        # time here) and store it against the run number in the trial results
         # dataframe.
-        for run in range(g.number_of_runs):
-            random.seed(run)
-
-            my_model = Model(run)
-            model_outputs = my_model.run()
-            patient_level_results = model_outputs["results"]
-            event_log = model_outputs["event_log"]
-
-            self.df_trial_results.loc[run] = [
-                len(patient_level_results),
-                my_model.mean_q_time_cubicle,
-            ]
-
-            # print(event_log)
+        runs = range(g.number_of_runs)
+        if n_jobs == 1:
+            run_outputs = [execute_run(run) for run in runs]
+        else:
+            # Hand on g's current values, which the other processes can't see
+            with multiprocessing.Pool(n_jobs) as pool:
+                run_outputs = pool.map(
+                    partial(execute_run, settings=class_settings(g)), runs
+                    )
+
+        trial_results = []
+        for run, (arrivals, mean_q_time_cubicle, event_log) in zip(runs, run_outputs):
+            trial_results.append((run, arrivals, mean_q_time_cubicle))
 
             self.all_event_logs.append(event_log)
 
-        self.all_event_logs = pd.concat(self.all_event_logs)
+        # Build the trial results dataframe in one go, rather than adding a row
+        # to it for each run
+        self.df_trial_results = pd.DataFrame(
+            trial_results,
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
+
+        # Join each event log column up across all the runs (one allocation
+        # and copy per column) and only then build the trial's dataframe
+        self.all_event_logs = pd.DataFrame({
+            column: np.concatenate([event_log[column] for event_log in self.all_event_logs])
+            for column in self.all_event_logs[0]
+        })
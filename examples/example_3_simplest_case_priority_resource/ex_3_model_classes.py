@@ -1,9 +1,13 @@
+import multiprocessing
 import random
+from array import array
+from functools import partial
 import numpy as np
 import pandas as pd
 import simpy
 from sim_tools.distributions import Exponential, Lognormal
 from vidigi.resources import populate_store, VidigiPriorityStoreLegacy as VidigiPriorityStore
+from examples.simulation_utility_functions import BatchRNG, class_settings, apply_settings
 
 class g:
     '''
@@ -28,6 +32,10 @@ class g:
         Set the mean of the exponential distribution that is used to sample the
         inter-arrival time of patients
 
+    enable_event_log: bool
+        Whether to record the event log used for the vidigi animation. Turn
+        off when only the run results are needed.
+
     '''
     random_number_set = 42
 
@@ -39,11 +47,17 @@ class g:
     sim_duration = 600
     number_of_runs = 100
 
+    enable_event_log = True
+
 class Patient:
     '''
     Class defining details for a patient entity
     '''
-    def __init__(self, p_id):
+    # One is created per arrival, so no per-instance __dict__
+    __slots__ = ('identifier', 'arrival', 'wait_treat', 'total_time',
+                 'treat_duration', 'priority')
+
+    def __init__(self, p_id, rng):
         '''
         Constructor method
 
@@ -51,6 +65,10 @@ class Patient:
         -----
         identifier: int
             a numeric identifier for the patient.
+
+        rng: random.Random
+            the model's random number generator, used to pick the patient's
+            priority.
         '''
         self.identifier = p_id
         self.arrival = -np.inf
@@ -60,7 +78,7 @@ class Patient:
 
         # Randomly initialise a patient priority value
         # Lower values will be prioritised - so priority 1 will be seen before priority 2
-        if random.uniform(0, 1) < 0.2:
+        if rng.random() < 0.2:
             self.priority = 1
         else:
             self.priority = 2
@@ -79,7 +97,18 @@ class Model:
         # Create a SimPy environment in which everything will live
         self.env = simpy.Environment()
 
-        self.event_log = []
+        # Event log columns (missing resource IDs are NaN)
+        self._ev_patient = array('q')
+        self._ev_pathway = array('q')
+        self._ev_event_type = []
+        self._ev_event = []
+        self._ev_time = array('d')
+        self._ev_resource_id = array('d')
+
+        # With the event log turned off (g.enable_event_log), events are
+        # dropped as they come in rather than being recorded
+        if not g.enable_event_log:
+            self._log_event = self._discard_event
 
         # Create a patient counter (which we'll use as a patient ID)
         self.patient_counter = 0
@@ -92,23 +121,48 @@ class Model:
         # Store the passed in run number
         self.run_number = run_number
 
-        # Create a new Pandas DataFrame that will store some results against
-        # the patient ID (which we'll use as the index).
-        self.results_df = pd.DataFrame()
-        self.results_df["Patient ID"] = [1]
-        self.results_df["Queue Time Cubicle"] = [0.0]
-        self.results_df["Time with Nurse"] = [0.0]
-        self.results_df.set_index("Patient ID", inplace=True)
-
-        # Create an attribute to store the mean queuing times across this run of
-        # the model
-        self.mean_q_time_cubicle = 0
-
-        self.patient_inter_arrival_dist = Exponential(mean = g.arrival_rate,
-                                                      random_seed = self.run_number*g.random_number_set)
-        self.treat_dist = Lognormal(mean = g.trauma_treat_mean,
-                                    stdev = g.trauma_treat_var,
-                                    random_seed = self.run_number*g.random_number_set)
+        # Each model has its own generator for patient priorities, seeded with
+        # the run number, rather than sharing the global one in the random
+        # module
+        self.priority_rng = random.Random(self.run_number)
+
+        # Running total and count of the queuing times for a cubicle, added to
+        # as each patient is seen
+        self._wait_sum = 0.0
+        self._wait_n = 0
+
+        # Create attributes to store the number of arrivals and mean queuing
+        # time across this run of the model
+        self.arrivals_count = 0
+        self.mean_q_time_cubicle = 0.0
+
+        # Samples are drawn from the distributions in batches (see BatchRNG)
+        self.patient_inter_arrival_dist = BatchRNG(
+            Exponential(mean = g.arrival_rate,
+                        random_seed = self.run_number*g.random_number_set)
+            )
+        self.treat_dist = BatchRNG(
+            Lognormal(mean = g.trauma_treat_mean,
+                      stdev = g.trauma_treat_var,
+                      random_seed = self.run_number*g.random_number_set)
+            )
+
+    def _log_event(self, patient, pathway, event_type, event, time,
+                   resource_id=None):
+        '''
+        Record an event in the columns of the event log
+        '''
+        self._ev_patient.append(patient)
+        self._ev_pathway.append(pathway)
+        self._ev_event_type.append(event_type)
+        self._ev_event.append(event)
+        self._ev_time.append(time)
+        self._ev_resource_id.append(np.nan if resource_id is None else resource_id)
+
+    def _discard_event(self, *args, **kwargs):
+        '''
+        Stands in for _log_event when the event log is turned off
+        '''
 
     def init_resources(self):
         '''
@@ -127,26 +181,34 @@ class Model:
 
     # A generator function that represents the DES generator for patient arrivals
     def generator_patient_arrivals(self):
+        # Look up the methods used for every arrival once, up front
+        process = self.env.process
+        timeout = self.env.timeout
+        sample = self.patient_inter_arrival_dist.sample
+        patients_append = self.patients.append
+        attend = self.attend_clinic
+        priority_rng = self.priority_rng
+
         # Use an infinite loop here to keep doing this indefinitely while the simulation runs
         while True:
             # Increment the patient counter by 1 (first patient will have an ID of 1)
             self.patient_counter += 1
 
-            p = Patient(self.patient_counter)
+            p = Patient(self.patient_counter, priority_rng)
 
             # Store patient in list for later easy access
-            self.patients.append(p)
+            patients_append(p)
 
             # Tell SimPy to start up the attend_clinic generator function with this patient
             # (the generator function that will model the patient's journey through the system)
-            self.env.process(self.attend_clinic(p))
+            process(attend(p))
 
             # Randomly sample the time to the next patient arriving
-            sampled_inter = self.patient_inter_arrival_dist.sample()
+            sampled_inter = sample()
 
             # Freeze this instance of this function in place until the inter-arrival time
             # sampled above has elapsed
-            yield self.env.timeout(sampled_inter)
+            yield timeout(sampled_inter)
 
     def attend_clinic(self, patient):
         """
@@ -155,92 +217,84 @@ class Model:
         The patient object is passed in to the generator function so we can extract information
         from / record information to it
         """
-        self.arrival = self.env.now
+        # The simulation time only moves on at a yield, so it is read once
+        # after each one and reused for every calculation and log entry up to
+        # the next
+        now = self.env.now
+
+        patient.arrival = now
 
         # ===== LOGGING FOR VIDIGI ANIMATION  ===== #
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': patient.priority,
-             'event_type': 'arrival_departure',
-             'event': 'arrival',
-             'time': self.env.now}
-        )
+        self._log_event(patient=patient.identifier, pathway=patient.priority,
+                        event_type='arrival_departure', event='arrival',
+                        time=now)
         # ========================================= #
 
         # request examination resource
-        start_wait = self.env.now
+        start_wait = now
 
         # ===== LOGGING FOR VIDIGI ANIMATION  ===== #
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': patient.priority,
-             'event': 'treatment_wait_begins',
-             'event_type': 'queue',
-             'time': self.env.now}
-        )
+        self._log_event(patient=patient.identifier, pathway=patient.priority,
+                        event_type='queue', event='treatment_wait_begins',
+                        time=now)
         # ========================================= #
 
         # Seize a treatment resource when available
         # Note that we must pass in the patient priority
         treatment_resource = yield self.treatment_cubicles.get(priority=patient.priority)
+        now = self.env.now
 
-        # record the waiting time for registration
-        self.wait_treat = self.env.now - start_wait
+        # record the waiting time for treatment
+        patient.wait_treat = now - start_wait
+        self._wait_sum += patient.wait_treat
+        self._wait_n += 1
 
         # ===== LOGGING FOR VIDIGI ANIMATION  ===== #
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': patient.priority,
-                'event': 'treatment_begins',
-                'event_type': 'resource_use',
-                'time': self.env.now,
-                'resource_id': treatment_resource.id_attribute
-                }
-        )
+        self._log_event(patient=patient.identifier, pathway=patient.priority,
+                        event_type='resource_use', event='treatment_begins',
+                        time=now,
+                        resource_id=treatment_resource.id_attribute)
         # ========================================= #
 
         # sample treatment duration
-        self.treat_duration = self.treat_dist.sample()
-        yield self.env.timeout(self.treat_duration)
+        patient.treat_duration = self.treat_dist.sample()
+        yield self.env.timeout(patient.treat_duration)
+        now = self.env.now
 
         # ===== LOGGING FOR VIDIGI ANIMATION  ===== #
-        self.event_log.append(
-            {'patient': patient.identifier,
-                'pathway': patient.priority,
-                'event': 'treatment_complete',
-                'event_type': 'resource_use_end',
-                'time': self.env.now,
-                'resource_id': treatment_resource.id_attribute}
-        )
+        self._log_event(patient=patient.identifier, pathway=patient.priority,
+                        event_type='resource_use_end',
+                        event='treatment_complete', time=now,
+                        resource_id=treatment_resource.id_attribute)
         # ========================================= #
 
         # Resource is no longer in use, so put it back in
         self.treatment_cubicles.put(treatment_resource)
 
         # total time in system
-        self.total_time = self.env.now - self.arrival
+        patient.total_time = now - patient.arrival
 
         # ===== LOGGING FOR VIDIGI ANIMATION  ===== #
-        self.event_log.append(
-            {'patient': patient.identifier,
-            'pathway': patient.priority,
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
+        self._log_event(patient=patient.identifier, pathway=patient.priority,
+                        event_type='arrival_departure', event='depart',
+                        time=now)
         # ========================================= #
 
 
     # This method calculates results over a single run.  Here we just calculate
     # a mean, but in real world models you'd probably want to calculate more.
     def calculate_run_results(self):
-        # Take the mean of the queuing times across patients in this run of the
-        # model.
-        self.mean_q_time_cubicle = self.results_df["Queue Time Cubicle"].mean()
+        self.arrivals_count = self.patient_counter
 
-    # The run method starts up the DES entity generators, runs the simulation,
-    # and in turns calls anything we need to generate results for the run
-    def run(self):
+        # Take the mean of the queuing times across the patients who were seen
+        # in this run of the model.
+        self.mean_q_time_cubicle = (
+            self._wait_sum / self._wait_n if self._wait_n else 0.0
+            )
+
+    # Starts up the DES entity generators, runs the simulation, and in turn
+    # calls anything we need to generate results for the run
+    def _run_simulation(self):
         # Start up our DES entity generators that create new patients.  We've
         # only got one in this model, but we'd need to do this for each one if
         # we had multiple generators.
@@ -253,51 +307,120 @@ class Model:
         # run results
         self.calculate_run_results()
 
-        self.event_log = pd.DataFrame(self.event_log)
+    def _event_log_columns(self):
+        '''
+        Return the run's event log as a dict of column arrays, each given its
+        dtype up front.  Trial joins these up across runs before making a
+        single dataframe, rather than making one per run.
+        '''
+        return {
+            'patient': np.asarray(self._ev_patient, dtype=np.int64),
+            'pathway': np.asarray(self._ev_pathway, dtype=np.int64),
+            'event_type': np.array(self._ev_event_type, dtype=object),
+            'event': np.array(self._ev_event, dtype=object),
+            'time': np.asarray(self._ev_time, dtype=np.float64),
+            'resource_id': np.asarray(self._ev_resource_id, dtype=np.float64),
+            'run': np.full(len(self._ev_time), self.run_number),
+        }
+
+    # The run method carries out the run and hands back its results and its
+    # event log as a dataframe
+    def run(self):
+        self._run_simulation()
+
+        self.event_log = pd.DataFrame(self._event_log_columns())
+
+        return {'results': {'Arrivals': self.arrivals_count,
+                            'Mean Queue Time Cubicle': self.mean_q_time_cubicle},
+                'event_log': self.event_log}
+
+# Function that carries out a single run of the model.  This lives outside of
+# the Trial class so that it can be sent to other processes to run in parallel.
+def execute_run(run_number, settings=None):
+    '''
+    Run the model once
+
+    Params:
+    -----
+    run_number: int
+        The run number, which is also used to seed the model's random numbers
+
+    settings: dict, optional
+        Values to set on the g class before the run, from class_settings(g)
+
+    Returns:
+    -----
+    tuple of (number of arrivals, mean queue time for a cubicle, event log as
+    a dict of column arrays)
+    '''
+    if settings is not None:
+        apply_settings(g, settings)
 
-        self.event_log["run"] = self.run_number
+    my_model = Model(run_number)
+    my_model._run_simulation()
 
-        return {'results': self.results_df, 'event_log': self.event_log}
+    return (my_model.arrivals_count, my_model.mean_q_time_cubicle,
+            my_model._event_log_columns())
 
 # Class representing a Trial for our simulation - a batch of simulation runs.
 class Trial:
-    # The constructor sets up a pandas dataframe that will store the key
+    # The constructor sets up an empty pandas dataframe that will store the key
     # results from each run against run number, with run number as the index.
     def  __init__(self):
-        self.df_trial_results = pd.DataFrame()
-        self.df_trial_results["Run Number"] = [0]
-        self.df_trial_results["Arrivals"] = [0]
-        self.df_trial_results["Mean Queue Time Cubicle"] = [0.0]
-        self.df_trial_results.set_index("Run Number", inplace=True)
+        self.df_trial_results = pd.DataFrame(
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
         self.all_event_logs = []
 
     # Method to run a trial
-    def run_trial(self):
+    def run_trial(self, n_jobs=1):
+        '''
+        Run the model g.number_of_runs times
+
+        Params:
+        -----
+        n_jobs: int or None, optional
+            Number of processes to spread the runs across. Defaults to 1, which
+            carries out the runs one after another in this process; pass None
+            for one per CPU core.
+        '''
         print(f"{g.n_cubicles} nurses")
         print("") ## Print a blank line
 
         # Run the simulation for the number of runs specified in g class.
-        # For each run, we create a new instance of the Model class and call its
-        # run method, which sets everything else in motion.  Once the run has
-        # completed, we grab out the stored run results (just mean queuing time
-        # here) and store it against the run number in the trial results
+        # Each run creates a new instance of the Model class and calls its
+        # run method, which sets everything else in motion.  The runs don't
+        # share any state, so they can be carried out in parallel.  Once they
+        # have completed, we grab out the stored run results (just mean queuing
+        # time here) and store it against the run number in the trial results
         # dataframe.
-        for run in range(g.number_of_runs):
-            random.seed(run)
-
-            my_model = Model(run)
-            model_outputs = my_model.run()
-            patient_level_results = model_outputs["results"]
-            event_log = model_outputs["event_log"]
-
-            self.df_trial_results.loc[run] = [
-                len(patient_level_results),
-                my_model.mean_q_time_cubicle,
-            ]
+        runs = range(g.number_of_runs)
+        if n_jobs == 1:
+            run_outputs = [execute_run(run) for run in runs]
+        else:
+            # Hand on g's current values, which the other processes can't see
+            with multiprocessing.Pool(n_jobs) as pool:
+                run_outputs = pool.map(
+                    partial(execute_run, settings=class_settings(g)), runs
+                    )
 
-            # print(event_log)
+        trial_results = []
+        for run, (arrivals, mean_q_time_cubicle, event_log) in zip(runs, run_outputs):
+            trial_results.append((run, arrivals, mean_q_time_cubicle))
 
             self.all_event_logs.append(event_log)
 
-        self.all_event_logs = pd.concat(self.all_event_logs)
+        # Build the trial results dataframe in one go, rather than adding a row
+        # to it for each run
+        self.df_trial_results = pd.DataFrame(
+            trial_results,
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
+
+        # Join each event log column up across all the runs (one allocation
+        # and copy per column) and only then build the trial's dataframe
+        self.all_event_logs = pd.DataFrame({
+            column: np.concatenate([event_log[column] for event_log in self.all_event_logs])
+            for column in self.all_event_logs[0]
+        })
@@ -4,6 +4,9 @@ Time units of the simulation model are in minutes.
 '''
 # Imports
 
+from functools import partial
+import multiprocessing
+
 import numpy as np
 import pandas as pd
 import ciw
@@ -84,32 +87,44 @@ def single_run(experiment, rc_period=RESULTS_COLLECTION_PERIOD, random_seed=None
 
     recs = sim_engine.get_all_records()
 
-    op_servicetimes = [r.service_time for r in recs if r.node == 1]
-    nurse_servicetimes = [r.service_time for r in recs if r.node == 2]
+    n_recs = len(recs)
+    nodes = np.fromiter((r.node for r in recs), dtype=np.int64, count=n_recs)
+    servicetimes = np.fromiter((r.service_time for r in recs), dtype=np.float64, count=n_recs)
+    waits = np.fromiter((r.waiting_time for r in recs), dtype=np.float64, count=n_recs)
 
-    op_waits = [r.waiting_time for r in recs if r.node == 1]
-    nurse_waits = [r.waiting_time for r in recs if r.node == 2]
+    op = nodes == 1
+    nurse = nodes == 2
 
-    run_results['01_mean_waiting_time'] = np.mean(op_waits)
+    run_results['01_mean_waiting_time'] = waits[op].mean()
     run_results['02_operator_util'] = (
-        sum(op_servicetimes) / (rc_period * experiment.n_operators)
+        servicetimes[op].sum() / (rc_period * experiment.n_operators)
     ) * 100.0
-    run_results['03_mean_nurse_waiting_time'] = np.mean(nurse_waits)
+    run_results['03_mean_nurse_waiting_time'] = waits[nurse].mean()
     run_results['04_nurse_util'] = (
-        sum(nurse_servicetimes) / (rc_period * experiment.n_nurses)
+        servicetimes[nurse].sum() / (rc_period * experiment.n_nurses)
     ) * 100.0
 
     return run_results, recs
 
 
-def multiple_replications(experiment, rc_period=RESULTS_COLLECTION_PERIOD, n_reps=5):
-    results = []
-    logs = []
+def single_replication(rep, experiment, rc_period=RESULTS_COLLECTION_PERIOD):
+    # One replication of the model, seeded with its replication number
+    return single_run(experiment, rc_period, random_seed=rep)
+
+
+def multiple_replications(experiment, rc_period=RESULTS_COLLECTION_PERIOD, n_reps=5,
+                          n_jobs=1):
+    # The replications are independent, so can be spread across n_jobs
+    # processes (n_jobs=None for one per CPU core)
+    run = partial(single_replication, experiment=experiment, rc_period=rc_period)
+    if n_jobs == 1:
+        run_outputs = [run(rep) for rep in range(n_reps)]
+    else:
+        with multiprocessing.Pool(n_jobs) as pool:
+            run_outputs = pool.map(run, range(n_reps))
 
-    for rep in range(n_reps):
-        run_result, log = single_run(experiment, rc_period)
-        results.append(run_result)
-        logs.append(log)
+    results = [run_result for run_result, log in run_outputs]
+    logs = [log for run_result, log in run_outputs]
 
     df_results = pd.DataFrame(results)
     df_results.index = np.arange(1, len(df_results) + 1)
@@ -5,6 +5,9 @@ Time units of the simulation model are in minutes.
 '''
 # Imports
 
+from functools import partial
+import multiprocessing
+
 import numpy as np
 import pandas as pd
 import ciw
@@ -153,35 +156,71 @@ def single_run(experiment,
     # get all results
     recs = sim_engine.get_all_records()
 
-    # operator service times
-    op_servicetimes = [r.service_time for r in recs if r.node==1]
-    # nurse service times
-    nurse_servicetimes = [r.service_time for r in recs if r.node==2]
+    # node, service time and waiting time of every record, gathered into
+    # arrays once rather than filtering the records again for each measure
+    n_recs = len(recs)
+    nodes = np.fromiter((r.node for r in recs), dtype=np.int64, count=n_recs)
+    servicetimes = np.fromiter((r.service_time for r in recs),
+                               dtype=np.float64, count=n_recs)
+    waits = np.fromiter((r.waiting_time for r in recs),
+                        dtype=np.float64, count=n_recs)
+
+    # operator (node 1) and nurse (node 2) records
+    op = nodes==1
+    nurse = nodes==2
+
+    # operator and nurse service times
+    op_servicetimes = servicetimes[op]
+    nurse_servicetimes = servicetimes[nurse]
 
     # operator and nurse waiting times
-    op_waits = [r.waiting_time for r in recs if r.node==1]
-    nurse_waits = [r.waiting_time for r in recs if r.node==2]
+    op_waits = waits[op]
+    nurse_waits = waits[nurse]
 
     # mean measures
-    run_results['01_mean_waiting_time'] = np.mean(op_waits)
+    run_results['01_mean_waiting_time'] = op_waits.mean()
 
     # end of run results: calculate mean operator utilisation
     run_results['02_operator_util'] = \
-        (sum(op_servicetimes) / (rc_period * experiment.n_operators)) * 100.0
+        (op_servicetimes.sum() / (rc_period * experiment.n_operators)) * 100.0
 
     # end of run results: nurse waiting time
-    run_results['03_mean_nurse_waiting_time'] = np.mean(nurse_waits)
+    run_results['03_mean_nurse_waiting_time'] = nurse_waits.mean()
 
     # end of run results: calculate mean nurse utilisation
     run_results['04_nurse_util'] = \
-        (sum(nurse_servicetimes) / (rc_period * experiment.n_nurses)) * 100.0
+        (nurse_servicetimes.sum() / (rc_period * experiment.n_nurses)) * 100.0
 
     # return the results from the run of the model
     return run_results, recs
 
+def single_replication(rep, experiment, rc_period=RESULTS_COLLECTION_PERIOD):
+    '''
+    Perform a single replication of the model, seeded with its replication
+    number.
+
+    Params:
+    ------
+    rep: int
+        The replication number
+
+    experiment: Experiment
+        The experiment/paramaters to use with model
+
+    rc_period: float, optional (default=DEFAULT_RESULTS_COLLECTION_PERIOD)
+        results collection period.
+        the number of minutes to run the model to collect results
+
+    Returns:
+    --------
+    tuple of (results dict, log)
+    '''
+    return single_run(experiment, rc_period, random_seed=rep)
+
 def multiple_replications(experiment,
                           rc_period=RESULTS_COLLECTION_PERIOD,
-                          n_reps=5):
+                          n_reps=5,
+                          n_jobs=1):
     '''
     Perform multiple replications of the model.
 
@@ -197,14 +236,28 @@ def multiple_replications(experiment,
     n_reps: int, optional (default=5)
         Number of independent replications to run.
 
+    n_jobs: int, optional (default=1)
+        Number of processes to spread the replications across. Defaults to
+        running them one after another in this process; pass None for one
+        per CPU core.
+
     Returns:
     --------
     pandas.DataFrame
     '''
 
-    # loop over single run to generate results dicts in a python list.
-    results = [single_run(experiment, rc_period)[0] for rep in range(n_reps)]
-    logs = [single_run(experiment, rc_period)[1] for rep in range(n_reps)]
+    # carry out each replication, one after another unless told otherwise.
+    # Each replication returns its results dict along with its log.
+    run = partial(single_replication, experiment=experiment, rc_period=rc_period)
+    if n_jobs == 1:
+        run_outputs = [run(rep) for rep in range(n_reps)]
+    else:
+        with multiprocessing.Pool(n_jobs) as pool:
+            run_outputs = pool.map(run, range(n_reps))
+
+    # split the outputs into a python list of results dicts and one of logs.
+    results = [run_result for run_result, log in run_outputs]
+    logs = [log for run_result, log in run_outputs]
 
     # format and return results in a dataframe
     df_results = pd.DataFrame(results)
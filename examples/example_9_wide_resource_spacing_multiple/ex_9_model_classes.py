@@ -1,8 +1,11 @@
+import multiprocessing
+from functools import partial
 import pandas as pd
 from sim_tools.distributions import Exponential, Lognormal, Uniform
 from vidigi.resources import VidigiStore
 from vidigi.logging import EventLogger
 import simpy
+from examples.simulation_utility_functions import BatchRNG, class_settings, apply_settings
 
 class g:
     # Simulation Duration Parameters (time units are hours)
@@ -26,11 +29,18 @@ class g:
     # Simulation and Trial Parameters
     number_of_runs = 100  # Number of simulation runs in a trial [5, 6, 8, 19]
 
+    # Whether to record the event log used for the vidigi animation.  Turn off
+    # when the event log isn't needed.
+    enable_event_log = True
+
 
 class Patient:
     '''
     Class defining details for a patient entity
     '''
+    # One is created per arrival, so no per-instance __dict__
+    __slots__ = ('id',)
+
     def __init__(self, p_id):
         '''
         Constructor method
@@ -61,8 +71,10 @@ class Model:
         self.run_number = run_number
 
         # By passing in the env we've created, the logger will default to the simulation
-        # time when populating the time column of our event logs
-        self.logger = EventLogger(env=self.env, run_number=self.run_number)
+        # time when populating the time column of our event logs.  With the
+        # event log turned off, the logger discards events without recording them.
+        self.logger = EventLogger(env=self.env, run_number=self.run_number,
+                                  enabled=g.enable_event_log)
 
         # Create a patient counter (which we'll use as a patient ID)
         self.patient_counter = 0
@@ -77,22 +89,23 @@ class Model:
         self.init_resources()
 
     def init_distributions(self):
-        self.patient_inter_arrival_dist = Exponential(
+        # Samples are drawn from the distributions in batches (see BatchRNG)
+        self.patient_inter_arrival_dist = BatchRNG(Exponential(
             mean = g.patient_inter_arrival_time,
             random_seed = (abs(self.run_number) + 1) * 1
-            )
+            ))
 
-        self.treat_dist = Lognormal(
+        self.treat_dist = BatchRNG(Lognormal(
             mean = g.mean_time_in_bed,
             stdev = g.sd_time_in_bed,
             random_seed = (abs(self.run_number) + 1) * 2
-            )
+            ))
 
-        self.ward_choice_dist = Uniform(
+        self.ward_choice_dist = BatchRNG(Uniform(
             low=1,
             high=4,
             random_seed = (abs(self.run_number) + 1) * 2
-            )
+            ))
 
     def init_resources(self):
         '''
@@ -106,9 +119,23 @@ class Model:
         self.beds_ward_oak = VidigiStore(self.env, num_resources=g.number_of_beds_oak)
         self.beds_ward_maple = VidigiStore(self.env, num_resources=g.number_of_beds_maple)
 
+        # The name and beds of each ward, in the order they are chosen from
+        self.wards = (
+            ("ash", self.beds_ward_ash),
+            ("oak", self.beds_ward_oak),
+            ("maple", self.beds_ward_maple),
+            )
+
     # A generator function that represents the DES generator for patient
     # arrivals
     def generator_patient_arrivals(self):
+        # Look up the methods used for every arrival once, up front
+        process = self.env.process
+        timeout = self.env.timeout
+        sample = self.patient_inter_arrival_dist.sample
+        patients_append = self.patients.append
+        attend = self.attend_ward
+
         # We use an infinite loop here to keep doing this indefinitely whilst
         # the simulation runs
         while True:
@@ -122,74 +149,59 @@ class Model:
             p = Patient(self.patient_counter)
 
             # Store patient in list for later easy access
-            self.patients.append(p)
+            patients_append(p)
 
             # Tell SimPy to start up the attend_clinic generator function with
             # this patient (the generator function that will model the
             # patient's journey through the system)
-            self.env.process(self.attend_ward(p))
+            process(attend(p))
 
             # Randomly sample the time to the next patient arriving.  Here, we
             # sample from an exponential distribution (common for inter-arrival
             # times), and pass in a lambda value of 1 / mean.  The mean
             # inter-arrival time is stored in the g class.
-            sampled_inter = self.patient_inter_arrival_dist.sample()
+            sampled_inter = sample()
 
             # Freeze this instance of this function in place until the
             # inter-arrival time we sampled above has elapsed.  Note - time in
             # SimPy progresses in "Time Units", which can represent anything
             # you like (just make sure you're consistent within the model)
-            yield self.env.timeout(sampled_inter)
+            yield timeout(sampled_inter)
 
    # A generator function that represents the pathway for a patient going
     # through the clinic.
     # The patient object is passed in to the generator function so we can
     # extract information from / record information to it
     def attend_ward(self, patient):
-        self.logger.log_arrival(
-            entity_id=patient.id
-            )
+        # Every patient logs several events, so these are written straight into
+        # the log with log_unvalidated rather than going through the checks
+        # done by the log_arrival, log_queue etc. helpers
+        log = self.logger.log_unvalidated
+        patient_id = patient.id
 
-        self.logger.log_queue(
-            entity_id=patient.id,
-            event="bed_wait_begins"
-            )
+        log(patient_id, "arrival_departure", "arrival")
 
-        ward_choice = int(self.ward_choice_dist.sample())
+        log(patient_id, "queue", "bed_wait_begins")
 
-        if ward_choice == 1:
-            ward="ash"
-            beds = self.beds_ward_ash
-        elif ward_choice == 2:
-            ward="oak"
-            beds = self.beds_ward_oak
-        else:
-            ward="maple"
-            beds = self.beds_ward_maple
+        # Sampled values of 1, 2 and 3 send the patient to ash, oak and maple
+        # respectively
+        ward, beds = self.wards[int(self.ward_choice_dist.sample()) - 1]
 
         with beds.request() as req:
 
             # Seize a treatment resource when available
             bed_resource = yield req
 
-            self.logger.log_resource_use_start(
-                entity_id=patient.id,
-                event=f"{ward}_stay_begins",
-                resource_id=bed_resource.id_attribute
-                )
+            log(patient_id, "resource_use", f"{ward}_stay_begins",
+                resource_id=bed_resource.id_attribute)
 
             # sample treatment duration
             yield self.env.timeout(self.treat_dist.sample())
 
-            self.logger.log_resource_use_end(
-                entity_id=patient.id,
-                event=f"{ward}_stay_complete",
-                resource_id=bed_resource.id_attribute
-                )
+            log(patient_id, "resource_use_end", f"{ward}_stay_complete",
+                resource_id=bed_resource.id_attribute)
 
-        self.logger.log_departure(
-            entity_id=patient.id
-            )
+        log(patient_id, "arrival_departure", "depart")
 
     # The run method starts up the DES entity generators, runs the simulation,
     # and in turns calls anything we need to generate results for the run
@@ -203,27 +215,70 @@ class Model:
         self.env.run(until=g.sim_duration)
 
 
+# Function that carries out a single run of the model.  This lives outside of
+# the Trial class so that it can be sent to other processes to run in parallel.
+def execute_run(run_number, settings=None):
+    '''
+    Run the model once, returning its EventLogger
+
+    Params:
+    -----
+    run_number: int
+        The run number, which is also used to seed the model's distributions
+
+    settings: dict, optional
+        Values to set on the g class before the run, from class_settings(g)
+    '''
+    if settings is not None:
+        apply_settings(g, settings)
+
+    my_model = Model(run_number)
+    my_model.run()
+
+    # The logger no longer needs the simulation environment now the run is
+    # over, and dropping it means the logger can be sent back from another
+    # process
+    my_model.logger.env = None
+
+    return my_model.logger
+
+
 class Trial:
-    def  __init__(self):
+    def  __init__(self, n_jobs=1):
         self.all_event_logs = []
         self.trial_results_df = pd.DataFrame()
 
-        self.run_trial()
+        self.run_trial(n_jobs=n_jobs)
 
     # Method to run a trial
-    def run_trial(self):
+    def run_trial(self, n_jobs=1):
+        '''
+        Run the model g.number_of_runs times
+
+        Params:
+        -----
+        n_jobs: int or None, optional
+            Number of processes to spread the runs across. Defaults to 1, which
+            carries out the runs one after another in this process; pass None
+            for one per CPU core.
+        '''
         # Run the simulation for the number of runs specified in g class.
-        # For each run, we create a new instance of the Model class and call its
-        # run method, which sets everything else in motion.  Once the run has
-        # completed, we grab out the stored run results (just mean queuing time
-        # here) and store it against the run number in the trial results
-        # dataframe.
-        for run in range(1, g.number_of_runs + 1):
-            my_model = Model(run)
-            my_model.run()
-
-            self.all_event_logs.append(my_model.logger)
-
-        self.trial_results = pd.concat(
-            [run_results.to_dataframe() for run_results in self.all_event_logs]
+        # Each run creates a new instance of the Model class and calls its
+        # run method, which sets everything else in motion.  The runs don't
+        # share any state, so they can be carried out in parallel.  Once they
+        # have completed, we gather up each run's event logger.
+        runs = range(1, g.number_of_runs + 1)
+        if n_jobs == 1:
+            self.all_event_logs = [execute_run(run) for run in runs]
+        else:
+            # Hand on g's current values, which the other processes can't see
+            with multiprocessing.Pool(n_jobs) as pool:
+                self.all_event_logs = pool.map(
+                    partial(execute_run, settings=class_settings(g)), runs
+                    )
+
+        # Build the trial's event log with a single dataframe from every run's
+        # records, rather than building a dataframe per run and joining them
+        self.trial_results = pd.DataFrame.from_records(
+            [event for run_results in self.all_event_logs for event in run_results.log]
             )
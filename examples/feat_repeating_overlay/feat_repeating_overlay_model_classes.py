@@ -1,9 +1,12 @@
 import random
+from array import array
+from bisect import bisect_right
 import numpy as np
 import pandas as pd
 import simpy
 from sim_tools.distributions import Exponential, Lognormal
 from vidigi.resources import VidigiPriorityStore
+from examples.simulation_utility_functions import BatchRNG
 
 
 # Class to store global parameter values.  We don't create an instance of this
@@ -88,7 +91,13 @@ class Model:
         # Create a SimPy environment in which everything will live
         self.env = simpy.Environment()
 
-        self.event_log = []
+        # Event log columns (missing resource IDs are NaN)
+        self._ev_patient = array('q')
+        self._ev_pathway = []
+        self._ev_event_type = []
+        self._ev_event = []
+        self._ev_time = array('d')
+        self._ev_resource_id = array('d')
 
         # Create a patient counter (which we'll use as a patient ID)
         self.patient_counter = 0
@@ -103,15 +112,40 @@ class Model:
         # Store the passed in run number
         self.run_number = run_number
 
+        # The times at which the clinic closes and reopens, worked out once for
+        # the whole run so that finding the next closure is a lookup rather
+        # than a calculation for every patient
+        self._closure_starts = np.arange(
+            g.unav_freq, g.sim_duration + g.unav_freq, g.unav_freq
+            ).tolist()
+        self._closure_ends = [start + g.unav_time for start in self._closure_starts]
+
         # Create an attribute to store the mean queuing times across this run of
         # the model
         self.mean_q_time_cubicle = 0
 
-        self.patient_inter_arrival_dist = Exponential(mean = g.arrival_rate,
-                                                      random_seed = self.run_number*g.random_number_set)
-        self.treat_dist = Lognormal(mean = g.trauma_treat_mean,
-                                    stdev = g.trauma_treat_var,
-                                    random_seed = self.run_number*g.random_number_set)
+        # Samples are drawn from the distributions in batches (see BatchRNG)
+        self.patient_inter_arrival_dist = BatchRNG(
+            Exponential(mean = g.arrival_rate,
+                        random_seed = self.run_number*g.random_number_set)
+            )
+        self.treat_dist = BatchRNG(
+            Lognormal(mean = g.trauma_treat_mean,
+                      stdev = g.trauma_treat_var,
+                      random_seed = self.run_number*g.random_number_set)
+            )
+
+    def _log_event(self, patient, pathway, event_type, event, time,
+                   resource_id=None):
+        '''
+        Record an event in the columns of the event log
+        '''
+        self._ev_patient.append(patient)
+        self._ev_pathway.append(pathway)
+        self._ev_event_type.append(event_type)
+        self._ev_event.append(event)
+        self._ev_time.append(time)
+        self._ev_resource_id.append(np.nan if resource_id is None else resource_id)
 
     def init_resources(self):
         '''
@@ -126,96 +160,88 @@ class Model:
 
     # A generator function that represents the DES generator for patient arrivals
     def generator_patient_arrivals(self):
+        env = self.env
         while True:
+            # The time doesn't move on until we yield, so look it up once
+            now = env.now
+
             # Sample inter-arrival time
             sampled_inter = self.patient_inter_arrival_dist.sample()
-            next_arrival_time = self.env.now + sampled_inter
+            next_arrival_time = now + sampled_inter
 
-            # Calculate time until next closure and reopening
-            time_since_last_closure = self.env.now % g.unav_freq
-            time_until_closing = g.unav_freq - time_since_last_closure
-
-            unav_start = self.env.now + time_until_closing
+            # Look up the next closure and reopening
+            next_closure = bisect_right(self._closure_starts, now)
+            unav_start = self._closure_starts[next_closure]
 
             # Allow people to start arriving again before the clinic opens
-            unav_end = unav_start + g.unav_time
+            unav_end = self._closure_ends[next_closure]
 
             # If the next patient would arrive during the closure period, skip forward
             if next_arrival_time >= unav_start and next_arrival_time < unav_end:
-                yield self.env.timeout(unav_end - self.env.now)
+                yield env.timeout(unav_end - now)
                 continue  # Restart loop after skipping closure period
 
             # Wait for inter-arrival time before generating patient
-            yield self.env.timeout(sampled_inter)
+            yield env.timeout(sampled_inter)
 
             self.patient_counter += 1
             p = Patient(self.patient_counter)
             self.patients.append(p)
-            self.env.process(self.attend_clinic(p))
+            env.process(self.attend_clinic(p))
 
     # A generator function that represents the pathway for a patient going
     # through the clinic.
     # The patient object is passed in to the generator function so we can
     # extract information from / record information to it
     def attend_clinic(self, patient):
-        self.arrival = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Simplest',
-             'event_type': 'arrival_departure',
-             'event': 'arrival',
-             'time': self.env.now}
-        )
+        # The time only moves on at a yield, so it is looked up once after each
+        # one rather than for every use
+        env = self.env
+        log_event = self._log_event
+        now = env.now
+
+        self.arrival = now
+        log_event(patient=patient.identifier, pathway='Simplest',
+                  event_type='arrival_departure', event='arrival',
+                  time=now)
 
         # request examination resource
-        start_wait = self.env.now
-        self.event_log.append(
-            {'patient': patient.identifier,
-             'pathway': 'Simplest',
-             'event': 'treatment_wait_begins',
-             'event_type': 'queue',
-             'time': self.env.now}
-        )
+        start_wait = now
+        log_event(patient=patient.identifier, pathway='Simplest',
+                  event_type='queue', event='treatment_wait_begins',
+                  time=now)
 
         # Seize a treatment resource when available
-        current_time = self.env.now
-        time_since_last_closure = current_time % g.unav_freq
-        time_until_closing = g.unav_freq - time_since_last_closure
+        closure_starts = self._closure_starts
+        time_until_closing = closure_starts[bisect_right(closure_starts, now)] - now
 
         treatment_request_event = self.treatment_cubicles.get(priority=1)
 
         # Patients will give up and leave up to an hour before the clinic closes if they think they're
         # not going to get seen in time.
-        result_of_queue = yield treatment_request_event | self.env.timeout(time_until_closing - min([random.randint(0, 60), time_until_closing]))
+        result_of_queue = yield treatment_request_event | env.timeout(time_until_closing - min([random.randint(0, 60), time_until_closing]))
+        now = env.now
 
         if treatment_request_event in result_of_queue:
             cubicle = result_of_queue[treatment_request_event]
 
             # record the waiting time
-            self.wait_treat = self.env.now - start_wait
-
-            self.event_log.append(
-                {'patient': patient.identifier,
-                    'pathway': 'Simplest',
-                    'event': 'treatment_begins',
-                    'event_type': 'resource_use',
-                    'time': self.env.now,
-                    'resource_id': cubicle.id_attribute
-                    }
-            )
+            self.wait_treat = now - start_wait
+
+            log_event(patient=patient.identifier, pathway='Simplest',
+                      event_type='resource_use', event='treatment_begins',
+                      time=now,
+                      resource_id=cubicle.id_attribute)
 
             # sample treatment duration
             self.treat_duration = self.treat_dist.sample()
-            yield self.env.timeout(self.treat_duration)
-
-            self.event_log.append(
-                {'patient': patient.identifier,
-                    'pathway': 'Simplest',
-                    'event': 'treatment_complete',
-                    'event_type': 'resource_use_end',
-                    'time': self.env.now,
-                    'resource_id': cubicle.id_attribute}
-            )
+            yield env.timeout(self.treat_duration)
+            now = env.now
+
+            log_event(patient=patient.identifier, pathway='Simplest',
+                      event_type='resource_use_end', event='treatment_complete',
+                      time=now,
+                      resource_id=cubicle.id_attribute)
 
             self.treatment_cubicles.return_item(cubicle)
 
@@ -224,15 +250,11 @@ class Model:
             self.treatment_cubicles.cancel_get(treatment_request_event)
 
         # total time in system
-        self.total_time = self.env.now - self.arrival
+        self.total_time = now - self.arrival
 
-        self.event_log.append(
-            {'patient': patient.identifier,
-            'pathway': 'Simplest',
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
+        log_event(patient=patient.identifier, pathway='Simplest',
+                  event_type='arrival_departure', event='depart',
+                  time=now)
 
     # The run method starts up the DES entity generators, runs the simulation,
     # and in turns calls anything we need to generate results for the run
@@ -245,7 +267,14 @@ class Model:
         # Run the model for the duration specified in g class
         self.env.run(until=g.sim_duration)
 
-        self.event_log = pd.DataFrame(self.event_log)
+        self.event_log = pd.DataFrame({
+            'patient': self._ev_patient,
+            'pathway': self._ev_pathway,
+            'event_type': self._ev_event_type,
+            'event': self._ev_event,
+            'time': self._ev_time,
+            'resource_id': self._ev_resource_id,
+        }, copy=False)
 
         self.event_log["run"] = self.run_number
 
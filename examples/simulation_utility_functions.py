@@ -16,3 +16,71 @@ def trace(msg, show=TRACE):
     '''
     if show:
         print(msg)
+
+
+class BatchRNG:
+    '''
+    Wraps a sim_tools distribution so that samples are drawn from it in
+    batches of `size`, rather than with one call per sample.
+
+    Each call to sample() hands back the next value from the batch, drawing a
+    new batch once the current one is used up.
+
+    Params:
+    -------
+    dist: object
+        distribution with a sample(size) method returning a numpy array, e.g.
+        one from sim_tools.distributions.
+
+    size: int, optional (default=4096)
+        number of samples to draw in each batch.
+    '''
+    def __init__(self, dist, size=4096):
+        self.dist = dist
+        self.size = size
+        self._buffer = []
+        self._idx = 0
+
+    def sample(self):
+        if self._idx == len(self._buffer):
+            self._buffer = self.dist.sample(self.size).tolist()
+            self._idx = 0
+        value = self._buffer[self._idx]
+        self._idx += 1
+        return value
+
+
+def class_settings(cls):
+    '''
+    Return the current values of a parameter class's attributes (such as a
+    model's g class) as a dict.
+
+    Processes started with the 'spawn' method (the default on Windows and
+    macOS) import the model's module afresh, so don't see changes made to the
+    class in the process that started them. Pass these settings to each run
+    and apply them there with apply_settings().
+
+    Params:
+    -------
+    cls: type
+        the parameter class.
+    '''
+    return {name: value for name, value in vars(cls).items()
+            if not name.startswith('__')}
+
+
+def apply_settings(cls, settings):
+    '''
+    Set each of the settings returned by class_settings() back on the
+    parameter class.
+
+    Params:
+    -------
+    cls: type
+        the parameter class.
+
+    settings: dict
+        attribute names and values, as returned by class_settings().
+    '''
+    for name, value in settings.items():
+        setattr(cls, name, value)
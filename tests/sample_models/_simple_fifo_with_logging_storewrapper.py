@@ -1,4 +1,4 @@
-import random
+from statistics import fmean
 import numpy as np
 import pandas as pd
 import simpy
@@ -97,13 +97,8 @@ class Model:
         # Store the passed in run number
         self.run_number = run_number
 
-        # Create a new Pandas DataFrame that will store some results against
-        # the patient ID (which we'll use as the index).
-        self.results_df = pd.DataFrame()
-        self.results_df["Patient ID"] = [1]
-        self.results_df["Queue Time Cubicle"] = [0.0]
-        self.results_df["Time with Nurse"] = [0.0]
-        self.results_df.set_index("Patient ID", inplace=True)
+        # The queuing time of every patient seen in this run of the model
+        self.queue_times_cubicle = []
 
         # Create an attribute to store the mean queuing times across this run of
         # the model
@@ -115,6 +110,17 @@ class Model:
                                     stdev = g.trauma_treat_var,
                                     random_seed = self.run_number*g.random_number_set)
 
+    def _log_event(self, entity_id, pathway, event_type, event, time,
+                   resource_id=None):
+        '''
+        Record an event in the event log
+        '''
+        record = {'entity_id': entity_id, 'pathway': pathway,
+                  'event_type': event_type, 'event': event, 'time': time}
+        if resource_id is not None:
+            record['resource_id'] = resource_id
+        self.event_log.append(record)
+
     def init_resources(self):
         '''
         Init the number of resources
@@ -172,63 +178,49 @@ class Model:
     # The patient object is passed in to the generator function so we can
     # extract information from / record information to it
     def attend_clinic(self, patient):
-        self.arrival = self.env.now
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-             'pathway': 'Simplest',
-             'event_type': 'arrival_departure',
-             'event': 'arrival',
-             'time': self.env.now}
-        )
+        # The time only moves on at a yield, so look it up once after each one
+        env = self.env
+        now = env.now
+
+        self.arrival = now
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='arrival_departure', event='arrival',
+                        time=now)
 
         # request examination resource
-        start_wait = self.env.now
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-             'pathway': 'Simplest',
-             'event': 'treatment_wait_begins',
-             'event_type': 'queue',
-             'time': self.env.now}
-        )
+        start_wait = now
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='queue', event='treatment_wait_begins',
+                        time=now)
 
         # Seize a treatment resource when available
         with self.treatment_cubicles.request() as req:
             treatment_resource = yield req
+            now = env.now
             # record the waiting time for registration
-            self.wait_treat = self.env.now - start_wait
-            self.event_log.append(
-                {'entity_id': patient.identifier,
-                    'pathway': 'Simplest',
-                    'event': 'treatment_begins',
-                    'event_type': 'resource_use',
-                    'time': self.env.now,
-                    'resource_id': treatment_resource.id_attribute
-                    }
-            )
+            self.wait_treat = now - start_wait
+            self.queue_times_cubicle.append(self.wait_treat)
+            self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                            event_type='resource_use', event='treatment_begins',
+                            time=now,
+                            resource_id=treatment_resource.id_attribute)
 
             # sample treatment duration
             self.treat_duration = self.treat_dist.sample()
-            yield self.env.timeout(self.treat_duration)
-
-            self.event_log.append(
-                {'entity_id': patient.identifier,
-                    'pathway': 'Simplest',
-                    'event': 'treatment_complete',
-                    'event_type': 'resource_use_end',
-                    'time': self.env.now,
-                    'resource_id': treatment_resource.id_attribute}
-            )
+            yield env.timeout(self.treat_duration)
+            now = env.now
+
+            self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                            event_type='resource_use_end', event='treatment_complete',
+                            time=now,
+                            resource_id=treatment_resource.id_attribute)
 
 
         # total time in system
-        self.total_time = self.env.now - self.arrival
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-            'pathway': 'Simplest',
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
+        self.total_time = now - self.arrival
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='arrival_departure', event='depart',
+                        time=now)
 
 
     # This method calculates results over a single run.  Here we just calculate
@@ -236,7 +228,9 @@ class Model:
     def calculate_run_results(self):
         # Take the mean of the queuing times across patients in this run of the
         # model.
-        self.mean_q_time_cubicle = self.results_df["Queue Time Cubicle"].mean()
+        self.mean_q_time_cubicle = (
+            fmean(self.queue_times_cubicle) if self.queue_times_cubicle else 0.0
+            )
 
     # The run method starts up the DES entity generators, runs the simulation,
     # and in turns calls anything we need to generate results for the run
@@ -257,18 +251,16 @@ class Model:
 
         self.event_log["run"] = self.run_number
 
-        return {'results': self.results_df, 'event_log': self.event_log}
+        return {'event_log': self.event_log}
 
 # Class representing a Trial for our simulation - a batch of simulation runs.
 class Trial:
     # The constructor sets up a pandas dataframe that will store the key
     # results from each run against run number, with run number as the index.
     def  __init__(self):
-        self.df_trial_results = pd.DataFrame()
-        self.df_trial_results["Run Number"] = [0]
-        self.df_trial_results["Arrivals"] = [0]
-        self.df_trial_results["Mean Queue Time Cubicle"] = [0.0]
-        self.df_trial_results.set_index("Run Number", inplace=True)
+        self.df_trial_results = pd.DataFrame(
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
         self.all_event_logs = []
 
@@ -283,21 +275,23 @@ class Trial:
         # completed, we grab out the stored run results (just mean queuing time
         # here) and store it against the run number in the trial results
         # dataframe.
-        for run in range(g.number_of_runs):
-            random.seed(run)
+        trial_results = []
 
+        for run in range(g.number_of_runs):
             my_model = Model(run)
             model_outputs = my_model.run()
-            patient_level_results = model_outputs["results"]
-            event_log = model_outputs["event_log"]
 
-            self.df_trial_results.loc[run] = [
-                len(patient_level_results),
-                my_model.mean_q_time_cubicle,
-            ]
+            trial_results.append(
+                (run, my_model.patient_counter, my_model.mean_q_time_cubicle)
+                )
 
-            # print(event_log)
+            self.all_event_logs.append(model_outputs["event_log"])
 
-            self.all_event_logs.append(event_log)
+        # Build the trial results dataframe in one go, rather than adding a row
+        # to it for each run
+        self.df_trial_results = pd.DataFrame(
+            trial_results,
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
-        self.all_event_logs = pd.concat(self.all_event_logs)
+        self.all_event_logs = pd.concat(self.all_event_logs, ignore_index=True)
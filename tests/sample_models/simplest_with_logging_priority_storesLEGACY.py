@@ -1,4 +1,4 @@
-import random
+from statistics import fmean
 import numpy as np
 import pandas as pd
 import simpy
@@ -56,15 +56,12 @@ class Model:
 
         self.run_number = run_number
 
-        self.results_df = pd.DataFrame()
-        self.results_df["Patient ID"] = [1]
-        self.results_df["Queue Time Cubicle"] = [0.0]
-        self.results_df["Time with Nurse"] = [0.0]
-        self.results_df.set_index("Patient ID", inplace=True)
+        # The queuing time of every patient seen in this run of the model
+        self.queue_times_cubicle = []
 
         self.mean_q_time_cubicle = 0
 
-        self.seed_sequence = seed_sequence[0].spawn(3)
+        self.seed_sequence = seed_sequence.spawn(3)
 
         self.patient_priority_dist = Uniform(low=0, high=1,
             random_seed = self.seed_sequence[0]
@@ -82,6 +79,17 @@ class Model:
             )
 
 
+    def _log_event(self, entity_id, pathway, event_type, event, time,
+                   resource_id=None):
+        '''
+        Record an event in the event log
+        '''
+        record = {'entity_id': entity_id, 'pathway': pathway,
+                  'event_type': event_type, 'event': event, 'time': time}
+        if resource_id is not None:
+            record['resource_id'] = resource_id
+        self.event_log.append(record)
+
     def init_resources(self):
 
         self.treatment_cubicles = VidigiPriorityStoreLegacy(self.env)
@@ -95,7 +103,7 @@ class Model:
             for i in range(g.n_cubicles):
                 self.treatment_cubicles.put(
                     VidigiResource(
-                        self.env,
+                        env=self.env,
                         capacity=1,
                         id_attribute = i+1)
                     )
@@ -116,70 +124,58 @@ class Model:
             yield self.env.timeout(sampled_inter)
 
     def attend_clinic(self, patient):
-        self.arrival = self.env.now
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-             'pathway': 'Simplest',
-             'event_type': 'arrival_departure',
-             'event': 'arrival',
-             'time': self.env.now}
-        )
+        # The time only moves on at a yield, so look it up once after each one
+        env = self.env
+        now = env.now
+
+        self.arrival = now
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='arrival_departure', event='arrival',
+                        time=now)
 
         # request examination resource
-        start_wait = self.env.now
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-             'pathway': 'Simplest',
-             'event': 'treatment_wait_begins',
-             'event_type': 'queue',
-             'time': self.env.now}
-        )
+        start_wait = now
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='queue', event='treatment_wait_begins',
+                        time=now)
 
         # Seize a treatment resource when available
         treatment_resource = yield self.treatment_cubicles.get(priority=patient.priority)
+        now = env.now
 
         # record the waiting time for registration
-        self.wait_treat = self.env.now - start_wait
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-                'pathway': 'Simplest',
-                'event': 'treatment_begins',
-                'event_type': 'resource_use',
-                'time': self.env.now,
-                'resource_id': treatment_resource.id_attribute
-                }
-        )
+        self.wait_treat = now - start_wait
+        self.queue_times_cubicle.append(self.wait_treat)
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='resource_use', event='treatment_begins',
+                        time=now,
+                        resource_id=treatment_resource.id_attribute)
 
         # sample treatment duration
         self.treat_duration = self.treat_dist.sample()
-        yield self.env.timeout(self.treat_duration)
-
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-                'pathway': 'Simplest',
-                'event': 'treatment_complete',
-                'event_type': 'resource_use_end',
-                'time': self.env.now,
-                'resource_id': treatment_resource.id_attribute}
-        )
+        yield env.timeout(self.treat_duration)
+        now = env.now
+
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='resource_use_end', event='treatment_complete',
+                        time=now,
+                        resource_id=treatment_resource.id_attribute)
 
         # Resource is no longer in use, so put it back in
         self.treatment_cubicles.put(treatment_resource)
 
         # total time in system
-        self.total_time = self.env.now - self.arrival
-        self.event_log.append(
-            {'entity_id': patient.identifier,
-            'pathway': 'Simplest',
-            'event': 'depart',
-            'event_type': 'arrival_departure',
-            'time': self.env.now}
-        )
+        self.total_time = now - self.arrival
+        self._log_event(entity_id=patient.identifier, pathway='Simplest',
+                        event_type='arrival_departure', event='depart',
+                        time=now)
 
     def calculate_run_results(self):
         # Take the mean of the queuing times across patients in this run of the
         # model.
-        self.mean_q_time_cubicle = self.results_df["Queue Time Cubicle"].mean()
+        self.mean_q_time_cubicle = (
+            fmean(self.queue_times_cubicle) if self.queue_times_cubicle else 0.0
+            )
 
     def run(self):
         self.env.process(self.generator_patient_arrivals())
@@ -192,15 +188,13 @@ class Model:
 
         self.event_log["run"] = self.run_number
 
-        return {'results': self.results_df, 'event_log': self.event_log}
+        return {'event_log': self.event_log}
 
 class Trial:
     def  __init__(self, master_seed=42):
-        self.df_trial_results = pd.DataFrame()
-        self.df_trial_results["Run Number"] = [0]
-        self.df_trial_results["Arrivals"] = [0]
-        self.df_trial_results["Mean Queue Time Cubicle"] = [0.0]
-        self.df_trial_results.set_index("Run Number", inplace=True)
+        self.df_trial_results = pd.DataFrame(
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
         self.all_event_logs = []
 
@@ -209,25 +203,25 @@ class Trial:
 
     # Method to run a trial
     def run_trial(self, **kwargs):
+        trial_results = []
 
         for run in range(g.number_of_runs):
-            random.seed(run)
-
-            my_model = Model(
-                run,
-                seed_sequence=self.seed_sequence.spawn(1),
-                **kwargs
-                )
+            my_model = Model(run, seed_sequence=self.seed_sequence.spawn(1)[0],
+                             **kwargs)
 
             model_outputs = my_model.run()
-            patient_level_results = model_outputs["results"]
-            event_log = model_outputs["event_log"]
 
-            self.df_trial_results.loc[run] = [
-                len(patient_level_results),
-                my_model.mean_q_time_cubicle,
-            ]
+            trial_results.append(
+                (run, my_model.patient_counter, my_model.mean_q_time_cubicle)
+                )
+
+            self.all_event_logs.append(model_outputs["event_log"])
 
-            self.all_event_logs.append(event_log)
+        # Build the trial results dataframe in one go, rather than adding a row
+        # to it for each run
+        self.df_trial_results = pd.DataFrame(
+            trial_results,
+            columns=["Run Number", "Arrivals", "Mean Queue Time Cubicle"]
+            ).set_index("Run Number")
 
-        self.all_event_logs = pd.concat(self.all_event_logs)
+        self.all_event_logs = pd.concat(self.all_event_logs, ignore_index=True)
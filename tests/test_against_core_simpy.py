@@ -2,6 +2,8 @@
 # Tests written by hand but refactored by ChatGPT and further modified by a human.
 # OpenAI. (2025). ChatGPT (GPT-4-turbo) [Large language model]. https://chat.openai.com
 
+import os
+
 import pytest
 import pandas as pd
 from pandas.testing import assert_frame_equal
@@ -31,6 +33,7 @@ def run_trial(trial_cls, drop_resource_id=False, filename=None, run_kwargs=None)
     if drop_resource_id and "resource_id" in df.columns:
         df.drop(columns="resource_id", inplace=True)
     if filename:
+        os.makedirs("tests/outputs", exist_ok=True)
         df.to_csv(f"tests/outputs/{filename}.csv", index=False)
     return df.reset_index(drop=True)
 
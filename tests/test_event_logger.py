@@ -0,0 +1,149 @@
+import json
+
+import pandas as pd
+import pytest
+import simpy
+
+from vidigi.logging import BaseEvent, EventLogger
+
+
+@pytest.fixture
+def logger():
+    env = simpy.Environment()
+    return EventLogger(env=env)
+
+
+def test_to_dataframe_has_one_row_per_event(logger):
+    logger.log_arrival(entity_id=1)
+    logger.log_queue(entity_id=1, event="wait_begins")
+    logger.log_resource_use_start(entity_id=1, event="use_begins", resource_id=1)
+    logger.log_resource_use_end(entity_id=1, event="use_ends", resource_id=1)
+    logger.log_departure(entity_id=1)
+
+    df = logger.to_dataframe()
+
+    assert len(df) == 5
+    assert df["event"].tolist() == ["arrival", "wait_begins", "use_begins", "use_ends", "depart"]
+    assert (df["time"] == 0).all()
+
+
+def test_entity_attributes_are_joined_onto_every_event(logger):
+    logger.log_arrival(entity_id=1)
+    logger.log_entity_attributes(entity_id=1, fuel_level_start=10, fuel_level_end=50)
+    logger.log_queue(entity_id=1, event="wait_begins")
+    logger.log_arrival(entity_id="Truck 0")
+
+    df = logger.to_dataframe()
+
+    car_rows = df[df["entity_id"] == 1]
+    assert (car_rows["fuel_level_start"] == 10).all()
+    assert (car_rows["fuel_level_end"] == 50).all()
+    assert df.loc[df["entity_id"] == "Truck 0", "fuel_level_start"].isna().all()
+    assert df.index.tolist() == list(range(len(df)))
+
+
+def test_entity_attributes_are_included_in_json_and_filters(logger):
+    logger.log_arrival(entity_id=1)
+    logger.log_entity_attributes(entity_id=1, fuel_level_start=10)
+    logger.log_arrival(entity_id="Truck 0")
+
+    events = json.loads(logger.to_json_string())
+
+    assert events[0]["fuel_level_start"] == 10
+    assert "fuel_level_start" not in events[1]
+    assert logger.get_events_by_entity(1)["fuel_level_start"].tolist() == [10]
+    assert logger.get_log() == events
+
+
+def test_entity_attribute_named_like_an_event_field_is_rejected(logger):
+    with pytest.raises(ValueError, match="resource_id"):
+        logger.log_entity_attributes(entity_id=1, resource_id=3)
+
+
+def test_entity_attribute_named_like_an_extra_field_is_rejected(logger):
+    logger.log_arrival(entity_id=1, fuel_level=10)
+    logger.log_entity_attributes(entity_id=1, fuel_level=50)
+
+    with pytest.raises(ValueError, match="fuel_level"):
+        logger.to_dataframe()
+
+
+def test_to_csv_round_trips_log(logger, tmp_path):
+    logger.log_arrival(entity_id=1)
+    logger.log_queue(entity_id=1, event="wait_begins")
+    logger.log_departure(entity_id=1)
+
+    path = tmp_path / "log.csv"
+    logger.to_csv(path)
+
+    df = pd.read_csv(path)
+    assert df["event"].tolist() == ["arrival", "wait_begins", "depart"]
+    assert df["entity_id"].tolist() == [1, 1, 1]
+
+
+def test_log_batch_matches_individual_helpers(logger):
+    logger.log_arrival(entity_id=1)
+    logger.log_resource_use_end(entity_id=1, event="payment_ends", resource_id=2)
+
+    events = [
+        {"entity_id": 1, "event_type": "arrival_departure", "event": "arrival"},
+        {"entity_id": 1, "event_type": "resource_use_end", "event": "payment_ends", "resource_id": 2},
+    ]
+    logger.log_batch(events)
+
+    assert logger.log[:2] == logger.log[2:]
+    # The caller's dicts are not modified
+    assert "time" not in events[0]
+
+
+def test_disabled_logger_records_nothing():
+    logger = EventLogger(env=simpy.Environment(), enabled=False)
+    logger.log_arrival(entity_id=1)
+    logger.log_event(entity_id=1, event_type="queue", event="wait_begins")
+    logger.log_batch([{"entity_id": 1, "event_type": "arrival_departure", "event": "depart"}])
+    logger.log_entity_attributes(entity_id=1, colour="red")
+
+    assert logger.log == []
+    assert logger.to_dataframe().empty
+
+    logger.enabled = True
+    logger.log_arrival(entity_id=1)
+    assert len(logger.log) == 1
+
+
+def test_reset_clears_log_and_rebinds_env(logger):
+    logger.log_arrival(entity_id=1)
+    logger.log_entity_attributes(entity_id=1, colour="red")
+
+    new_env = simpy.Environment(initial_time=10)
+    logger.reset(env=new_env, run_number=2)
+    logger.log_arrival(entity_id=2)
+
+    df = logger.to_dataframe()
+    assert df["entity_id"].tolist() == [2]
+    assert df["time"].tolist() == [10]
+    assert df["run_number"].tolist() == [2]
+    assert "colour" not in df.columns
+
+
+def test_log_unvalidated_matches_helpers(logger):
+    logger.run_number = 1
+    logger.log_arrival(entity_id=1)
+    logger.log_resource_use_start(entity_id=1, event="use_begins", resource_id=2)
+
+    logger.log_unvalidated(1, "arrival_departure", "arrival")
+    logger.log_unvalidated(1, "resource_use", "use_begins", resource_id=2)
+
+    assert logger.log[:2] == logger.log[2:]
+    assert isinstance(logger.log[2]["time"], float)
+
+
+def test_log_unvalidated_refuses_custom_event_model():
+    class CustomEvent(BaseEvent):
+        pass
+
+    logger = EventLogger(event_model=CustomEvent, env=simpy.Environment())
+
+    with pytest.raises(TypeError, match="event_model"):
+        logger.log_unvalidated(1, "arrival_departure", "arrival")
+    assert logger.log == []
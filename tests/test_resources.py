@@ -0,0 +1,70 @@
+import simpy
+
+from vidigi.resources import VidigiPriorityStore, VidigiPriorityStoreLegacy, populate_store
+
+
+def _order_served(store, env, requests):
+    """Queue a get for each (name, priority) in requests while the store's single
+    resource is in use, returning the names in the order they were served."""
+    served = []
+
+    def holder():
+        resource = yield store.get(priority=0)
+        yield env.timeout(1)
+        store.put(resource)
+
+    def waiter(name, priority):
+        resource = yield store.get(priority=priority)
+        served.append(name)
+        yield env.timeout(1)
+        store.put(resource)
+
+    env.process(holder())
+    for name, priority in requests:
+        env.process(waiter(name, priority))
+    env.run()
+    return served
+
+
+REQUESTS = [("a", 2), ("b", 1), ("c", 2), ("d", 1), ("e", 3)]
+EXPECTED = ["b", "d", "a", "c", "e"]
+
+
+def test_priority_store_serves_by_priority_then_arrival():
+    env = simpy.Environment()
+    store = VidigiPriorityStore(env, num_resources=1)
+    assert _order_served(store, env, REQUESTS) == EXPECTED
+
+
+def test_legacy_priority_store_serves_by_priority_then_arrival():
+    env = simpy.Environment()
+    store = VidigiPriorityStoreLegacy(env)
+    populate_store(num_resources=1, simpy_store=store, sim_env=env)
+    assert _order_served(store, env, REQUESTS) == EXPECTED
+
+
+def test_priority_store_cancel_get_removes_only_that_request():
+    env = simpy.Environment()
+    store = VidigiPriorityStore(env)
+    first = store.get(priority=1)
+    cancelled = store.get(priority=1)
+    last = store.get(priority=2)
+
+    store.cancel_get(cancelled)
+    # Cancelling a request that is no longer queued does nothing
+    store.cancel_get(cancelled)
+
+    store.put("x")
+    store.put("y")
+    assert first.value == "x"
+    assert last.value == "y"
+    assert not cancelled.triggered
+    assert store.get_queue == []
+
+
+def test_priority_store_queued_requests_are_in_serving_order():
+    env = simpy.Environment()
+    store = VidigiPriorityStore(env)
+    gets = {name: store.get(priority=priority) for name, priority in REQUESTS}
+
+    assert store.queued_requests == [gets[name] for name in EXPECTED]
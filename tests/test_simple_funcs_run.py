@@ -33,6 +33,8 @@ event_position_df = pd.DataFrame([
 
 LIMIT_DURATION = g.sim_duration
 
+os.makedirs("tests/outputs/simple_funcs_run", exist_ok=True)
+
 @pytest.mark.quick
 def test_prep_RESHAPE_FOR_ANIMATIONS():
     try:
@@ -857,7 +857,7 @@ def animate_activity_log(
         Duration of transition between frames in milliseconds (default is 600).
     debug_mode : bool, optional
         If True, print debug information during processing (default is False).
-    custom_entity_icon_list: list, optional
+    custom_entity_icon_list: list or array-like, optional
         If given, overrides the default list of emojis used to represent entities
     background_image_opacity : float, optional
         Opacity (0 is transparent, to 1, completely opaque) of the provided background image
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, field_validator, model_validator, ValidationInfo
 from typing import Optional, Any, List, ClassVar, Set
 import json
+import os
 import pandas as pd
 from pathlib import Path
 from io import TextIOBase
@@ -10,6 +11,10 @@ import warnings
 
 RECOGNIZED_EVENT_TYPES = {'arrival_departure', 'resource_use', 'resource_use_end', 'queue'}
 
+# Default for whether EventLoggers record events. Setting the VIDIGI_LOG environment
+# variable to 0/false/no/off turns logging off for any logger not given `enabled`.
+VIDIGI_LOG = os.environ.get("VIDIGI_LOG", "1").strip().lower() not in ("0", "false", "no", "off")
+
 class BaseEvent(BaseModel):
     _warned_unrecognized_event_types: ClassVar[Set[str]] = set()
 
@@ -124,13 +129,28 @@ class BaseEvent(BaseModel):
         return self
 
 class EventLogger:
-    def __init__(self, event_model=BaseEvent, env: Any = None, run_number: int = None):
+    def __init__(self, event_model=BaseEvent, env: Any = None, run_number: int = None,
+                 enabled: Optional[bool] = None):
         self.event_model = event_model
         self.env = env  # Optional simulation env with .now
         self.run_number = run_number
+        # When False, every logging call returns immediately without recording anything
+        self.enabled = VIDIGI_LOG if enabled is None else enabled
         self._log: List[dict] = []
+        self._entity_attributes: dict = {}
 
     def log_event(self, context: Optional[dict] = None, **event_data):
+        if not self.enabled:
+            return
+        self._record(event_data, context=context)
+
+    def _record(self, event_data: dict, context: Optional[dict] = None):
+        """
+        Validate a single event and append it to the log.
+
+        The event is stored as a plain dict; the DataFrame is only built once, when
+        the log is exported.
+        """
         if "time" not in event_data:
             if self.env is not None and hasattr(self.env, "now"):
                 event_data["time"] = self.env.now
@@ -152,22 +172,38 @@ class EventLogger:
     # Logging Helper Functions                                      #
     #################################################################
 
+    def _record_helper_event(self, entity_id, event_type, event, time, pathway, run_number,
+                             extra_fields, resource_id=None, context=None):
+        """
+        Build the event dict for one of the logging helpers and record it.
+
+        Only fields that were actually provided are added, so a single dict is
+        built per event rather than building a full dict and then filtering out
+        the None values into a second one.
+        """
+        if not self.enabled:
+            return
+        event_data = {"entity_id": entity_id, "event_type": event_type, "event": event}
+        if time is not None:
+            event_data["time"] = time
+        if resource_id is not None:
+            event_data["resource_id"] = resource_id
+        if pathway is not None:
+            event_data["pathway"] = pathway
+        if run_number is not None:
+            event_data["run_number"] = run_number
+        for key, value in extra_fields.items():
+            if value is not None:
+                event_data[key] = value
+        self._record(event_data, context=context)
+
     def log_arrival(self, *, entity_id: Any, time: Optional[float] = None,
                     pathway: Optional[str] = None, run_number: Optional[int] = None,
                     **extra_fields):
         """
         Helper to log an arrival event with the correct event_type and event fields.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": "arrival_departure",
-            "event": "arrival",
-            "time": time,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(**{k: v for k, v in event_data.items() if v is not None})
+        self._record_helper_event(entity_id, "arrival_departure", "arrival", time, pathway, run_number, extra_fields)
 
     def log_departure(self, *, entity_id: Any, time: Optional[float] = None,
                       pathway: Optional[str] = None, run_number: Optional[int] = None,
@@ -175,16 +211,7 @@ class EventLogger:
         """
         Helper to log a departure event with the correct event_type and event fields.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": "arrival_departure",
-            "event": "depart",
-            "time": time,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(**{k: v for k, v in event_data.items() if v is not None})
+        self._record_helper_event(entity_id, "arrival_departure", "depart", time, pathway, run_number, extra_fields)
 
     def log_queue(self, *, entity_id: Any, event: str, time: Optional[float] = None,
                   pathway: Optional[str] = None, run_number: Optional[int] = None,
@@ -192,16 +219,7 @@ class EventLogger:
         """
         Log a queue event. The 'event' here can be any string describing the queue event.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": "queue",
-            "event": event,
-            "time": time,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(**{k: v for k, v in event_data.items() if v is not None})
+        self._record_helper_event(entity_id, "queue", event, time, pathway, run_number, extra_fields)
 
     def log_resource_use_start(self, *, entity_id: Any, resource_id: int, time: Optional[float] = None,
                                pathway: Optional[str] = None, run_number: Optional[int] = None,
@@ -209,17 +227,7 @@ class EventLogger:
         """
         Log the start of resource use. Requires resource_id.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": "resource_use",
-            "event": "start",
-            "time": time,
-            "resource_id": resource_id,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(**{k: v for k, v in event_data.items() if v is not None})
+        self._record_helper_event(entity_id, "resource_use", "start", time, pathway, run_number, extra_fields, resource_id=resource_id)
 
     def log_resource_use_end(self, *, entity_id: Any, resource_id: int, time: Optional[float] = None,
                              pathway: Optional[str] = None, run_number: Optional[int] = None,
@@ -227,17 +235,7 @@ class EventLogger:
         """
         Log the end of resource use. Requires resource_id.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": "resource_use_end",
-            "event": "end",
-            "time": time,
-            "resource_id": resource_id,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(**{k: v for k, v in event_data.items() if v is not None})
+        self._record_helper_event(entity_id, "resource_use_end", "end", time, pathway, run_number, extra_fields, resource_id=resource_id)
 
     def log_custom_event(self, *, entity_id: Any, event_type: str,
                          event: str,
@@ -249,34 +247,128 @@ class EventLogger:
         Log a custom event. The 'event' here can be any string describing the queue event.
         An 'event_type' must also be passed, but can be any string of the user's choosing.
         """
-        event_data = {
-            "entity_id": entity_id,
-            "event_type": event_type,
-            "event": event,
-            "time": time,
-            "pathway": pathway,
-            "run_number": run_number,
-        }
-        event_data.update(extra_fields)
-        self.log_event(
-            **{k: v for k, v in event_data.items() if v is not None},
-            context={"skip_event_type_check": True}
-        )
+        self._record_helper_event(entity_id, event_type, event, time, pathway, run_number, extra_fields,
+                                 context={"skip_event_type_check": True})
+
+    def log_batch(self, events: List[dict], context: Optional[dict] = None):
+        """
+        Log several events in a single call.
+
+        Each event is a dict of fields, as would be passed to log_event. As with
+        log_event, 'time' and 'run_number' are filled in from the simulation
+        environment and logger if not given, so this is most useful for recording
+        a group of events that all happen at the same moment.
+        """
+        if not self.enabled:
+            return
+        for event_data in events:
+            self._record(dict(event_data), context=context)
+
+    def log_unvalidated(self, entity_id: Any, event_type: str, event: str,
+                        time: Optional[float] = None, resource_id: Optional[int] = None,
+                        pathway: Optional[str] = None):
+        """
+        Log an event WITHOUT validating it.
+
+        Unlike every other logging method, this does not pass the event through the
+        event model: none of BaseEvent's checks are made (e.g. that an
+        'arrival_departure' event is 'arrival' or 'depart', or that resource_use events
+        have a resource_id), and a malformed event will only come to light when the log
+        is used. The event is appended directly in the form BaseEvent would produce.
+
+        This is intended for the innermost loops of models logging many thousands of
+        events, where the events are known to be well formed. As it can't honour a
+        custom event_model, it raises a TypeError if the logger has one.
+        """
+        if self.event_model is not BaseEvent:
+            raise TypeError(
+                "log_unvalidated() can't be used with a custom event_model, as it would "
+                "skip that model's validation. Use log_event() or the other logging "
+                "methods instead."
+            )
+        if not self.enabled:
+            return
+        if time is None:
+            if self.env is None or not hasattr(self.env, "now"):
+                raise ValueError("Missing 'time' and no simulation environment provided.")
+            time = self.env.now
+        self._log.append({
+            "entity_id": entity_id, "event_type": event_type, "event": event,
+            "time": float(time), "pathway": pathway, "run_number": self.run_number,
+            "timestamp": None, "resource_id": resource_id,
+        })
+
+    def log_entity_attributes(self, *, entity_id: Any, **attributes):
+        """
+        Record attributes that stay the same for an entity across all of its events.
+
+        Rather than being repeated on every event, these are stored once per entity and
+        joined on to each of its events by entity_id whenever the log is read (.log,
+        get_log(), the get_events_by_* methods and every export), so an attribute can't
+        share its name with a field of the events.
+        """
+        if not self.enabled:
+            return
+        clashes = [name for name in attributes if name in self.event_model.model_fields]
+        if clashes:
+            raise ValueError(
+                f"Entity attribute(s) {clashes} have the same name as event field(s). "
+                "Rename the attribute(s) so they can be joined on to the events."
+            )
+        self._entity_attributes.setdefault(entity_id, {}).update(attributes)
+
+    def reset(self, env: Any = None, run_number: Optional[int] = None):
+        """
+        Clear all recorded events and entity attributes so the logger can be reused.
+
+        If given, `env` and `run_number` replace the ones the logger was created with,
+        e.g. to point the logger at the environment for the next simulation run.
+        """
+        self._log = []
+        self._entity_attributes = {}
+        if env is not None:
+            self.env = env
+        if run_number is not None:
+            self.run_number = run_number
 
     ####################################################
     # Accessing and exporting the resulting logs       #
     ####################################################
 
+    def _attribute_clash_error(self, clashes) -> ValueError:
+        return ValueError(
+            f"Entity attribute(s) {clashes} have the same name as extra field(s) "
+            "logged with the events. Rename the attribute(s) or the field(s) so "
+            "they can be joined on to the events."
+        )
+
+    def _with_entity_attributes(self, events: List[dict]) -> List[dict]:
+        """Return the events with each entity's attributes added to its events."""
+        if not self._entity_attributes:
+            return events
+        merged = []
+        for event in events:
+            attributes = self._entity_attributes.get(event.get("entity_id"))
+            if attributes:
+                # Names are checked against the event fields when attributes are logged,
+                # but extra fields passed to the logging methods can only be checked here
+                clashes = sorted(attributes.keys() & event.keys())
+                if clashes:
+                    raise self._attribute_clash_error(clashes)
+                event = {**event, **attributes}
+            merged.append(event)
+        return merged
+
     @property
     def log(self):
-        return self._log
+        return self._with_entity_attributes(self._log)
 
     def get_log(self) -> List[dict]:
-        return self._log
+        return self._with_entity_attributes(self._log)
 
     def to_json_string(self, indent: int = 2) -> str:
         """Return the event log as a pretty JSON string."""
-        return json.dumps(self._log, indent=indent)
+        return json.dumps(self._with_entity_attributes(self._log), indent=indent)
 
     def to_json(self, path_or_buffer: str | Path | TextIOBase, indent: int = 2) -> None:
         """Write the event log to a JSON file or file-like buffer."""
@@ -301,7 +393,18 @@ class EventLogger:
 
     def to_dataframe(self) -> pd.DataFrame:
         """Convert the event log to a pandas DataFrame."""
-        return pd.DataFrame(self._log)
+        df = pd.DataFrame.from_records(self._log)
+
+        if self._entity_attributes and not df.empty:
+            entity_attributes_df = pd.DataFrame.from_dict(self._entity_attributes, orient="index")
+            # Names are checked against the event fields when attributes are logged, but
+            # extra fields passed to the logging methods can only be checked here
+            clashes = entity_attributes_df.columns.intersection(df.columns).tolist()
+            if clashes:
+                raise self._attribute_clash_error(clashes)
+            df = df.join(entity_attributes_df, on="entity_id")
+
+        return df
 
     ####################################################
     # Summarising Logs                                 #
@@ -325,22 +428,26 @@ class EventLogger:
     def get_events_by_run(self, run_number: Any, as_dataframe: bool = True):
         """Return all events associated with a specific entity_id."""
         filtered = [event for event in self._log if event.get("run_number") == run_number]
-        return pd.DataFrame(filtered) if as_dataframe else filtered
+        filtered = self._with_entity_attributes(filtered)
+        return pd.DataFrame.from_records(filtered) if as_dataframe else filtered
 
     def get_events_by_entity(self, entity_id: Any, as_dataframe: bool = True):
         """Return all events associated with a specific entity_id."""
         filtered = [event for event in self._log if event.get("entity_id") == entity_id]
-        return pd.DataFrame(filtered) if as_dataframe else filtered
+        filtered = self._with_entity_attributes(filtered)
+        return pd.DataFrame.from_records(filtered) if as_dataframe else filtered
 
     def get_events_by_event_type(self, event_type: str, as_dataframe: bool = True):
         """Return all events of a specific event_type."""
         filtered = [event for event in self._log if event.get("event_type") == event_type]
-        return pd.DataFrame(filtered) if as_dataframe else filtered
+        filtered = self._with_entity_attributes(filtered)
+        return pd.DataFrame.from_records(filtered) if as_dataframe else filtered
 
     def get_events_by_event_name(self, event: str, as_dataframe: bool = True):
         """Return all events of a specific event_type."""
         filtered = [event for event in self._log if event.get("event") == event]
-        return pd.DataFrame(filtered) if as_dataframe else filtered
+        filtered = self._with_entity_attributes(filtered)
+        return pd.DataFrame.from_records(filtered) if as_dataframe else filtered
 
     ####################################################
     # Plotting from logs                               #
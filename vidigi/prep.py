@@ -321,7 +321,7 @@ def generate_animation_df(
         Name of the column in `event_log` that specifies the actual event that occurred.
     debug_mode : bool, optional
         If True, print debug information during processing (default is False).
-    custom_entity_icon_list : list, optional
+    custom_entity_icon_list : list or array-like, optional
         If provided, will be used as the list for entity icons. Once the end of the list is reached,
         it will loop back around to the beginning (so e.g. if a list of 8 icons is provided, entities
         1 to 8 will use the provided emoji list, and then entity 9 will use the same icon as entity 1,
@@ -478,11 +478,11 @@ def generate_animation_df(
 
             icon_list.extend(additional_fun_icon_list)
     else:
-        icon_list = custom_entity_icon_list.copy()
+        icon_list = custom_entity_icon_list
 
-    full_icon_list = icon_list * int(np.ceil(len(individual_entities)/len(icon_list)))
-
-    full_icon_list = full_icon_list[0:len(individual_entities)]
+    # Cycle through the icons so each entity gets one, wrapping round if there are
+    # more entities than icons
+    full_icon_list = np.resize(np.asarray(icon_list, dtype=object), len(individual_entities))
 
     full_entity_df_plus_pos = full_entity_df_plus_pos.merge(
         pd.DataFrame(
@@ -22,6 +22,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SO
 
 """
 
+import heapq
+import itertools
 import simpy
 from simpy.core import BoundClass
 
@@ -325,6 +327,34 @@ class PriorityGetLegacy(simpy.resources.base.Get):
 
         super().__init__(resource)
 
+# MARK: LEGACY Priority Get Queue
+class PriorityGetQueueLegacy(list):
+    """
+    Queue keeping PriorityGetLegacy requests in order of their `key`.
+
+    Does the same job as SimPy's `SortedQueue`, but each new request is inserted
+    at its place in the (already sorted) queue with a binary search, rather than
+    the whole queue being re-sorted on every append. Requests with equal keys
+    stay in the order they were made.
+    """
+    def __init__(self, maxlen=None):
+        super().__init__()
+        self.maxlen = maxlen
+
+    def append(self, item):
+        if self.maxlen is not None and len(self) >= self.maxlen:
+            raise RuntimeError('Cannot append event. Queue is full.')
+
+        key = item.key
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self[mid].key:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.insert(lo, item)
+
 # MARK: LEGACY Priority Store
 class VidigiPriorityStoreLegacy(simpy.resources.store.Store):
     """
@@ -346,7 +376,7 @@ class VidigiPriorityStoreLegacy(simpy.resources.store.Store):
     # https://stackoverflow.com/questions/58603000/how-do-i-make-a-priority-get-request-from-resource-store
 
     """
-    GetQueue = simpy.resources.resource.SortedQueue
+    GetQueue = PriorityGetQueueLegacy
 
     get = BoundClass(PriorityGetLegacy)
 
@@ -365,6 +395,11 @@ class VidigiPriorityStore:
     This implementation provides the same API as the original VidigiPriorityStore
     but with immediate resource handoff between processes.
 
+    Waiting get requests are held in `get_queue`, a heap of
+    `(priority, request number, request)` tuples, so its entries are not the
+    requests themselves and are not in the order they will be served. Use
+    `queued_requests` for the waiting requests in the order they will be served.
+
     AI USE DISCLOSURE: This code was generated by Claude 3.7 Sonnet. It has been evaluated
     and tested by a human.
     """
@@ -388,8 +423,12 @@ class VidigiPriorityStore:
         self.capacity = capacity
         self.items = [] #if init_items is None else list(init_items)
 
-        # Custom priority queue for get requests
-        self.get_queue = []  # We'll maintain this as a sorted list
+        # Priority queue for get requests, kept as a heap of
+        # (priority, request number, request) entries.  The request number
+        # means requests with the same priority are served in the order they
+        # were made.
+        self.get_queue = []
+        self._get_counter = itertools.count()
         # Standard queue for put requests
         self.put_queue = []
 
@@ -456,17 +495,8 @@ class VidigiPriorityStore:
             request = self.env.event()
             request.priority = priority  # Add priority attribute to the event
 
-            # Insert into priority queue (sorted list)
-            # Find the right position to maintain sorted order
-            insert_pos = 0
-            for i, req in enumerate(self.get_queue):
-                if priority < req.priority:  # Lower value = higher priority
-                    insert_pos = i
-                    break
-                else:
-                    insert_pos = i + 1
-
-            self.get_queue.insert(insert_pos, request)
+            # Add to the priority queue (lower value = higher priority)
+            heapq.heappush(self.get_queue, (priority, next(self._get_counter), request))
 
             # Process any waiting put requests if possible
             self._process_put_queue()
@@ -486,8 +516,8 @@ class VidigiPriorityStore:
         if len(self.items) < self.capacity:
             # Space available - try to satisfy a waiting get request
             if self.get_queue:
-                # Get highest-priority waiting request (first item in sorted queue)
-                request = self.get_queue.pop(0)  # Get from front (highest priority)
+                # Get highest-priority waiting request
+                request = heapq.heappop(self.get_queue)[-1]
                 # Directly trigger the request with this item
                 request.succeed(item)
                 # No need to add to items list as it's immediately consumed
@@ -525,8 +555,8 @@ class VidigiPriorityStore:
     def _process_get_requests(self):
         """Process waiting get requests if items are available."""
         while self.get_queue and self.items:
-            # Get highest priority get request (first in sorted queue)
-            request = self.get_queue.pop(0)
+            # Get highest priority get request
+            request = heapq.heappop(self.get_queue)[-1]
             # Get an item
             item = self.items.pop(0)
             # Directly satisfy the get request
@@ -544,8 +574,8 @@ class VidigiPriorityStore:
         """
         # Check if there are waiting get requests
         if self.get_queue:
-            # Get highest priority waiting request (first in sorted queue)
-            request = self.get_queue.pop(0)
+            # Get highest priority waiting request
+            request = heapq.heappop(self.get_queue)[-1]
             # Directly trigger it with the item
             request.succeed(item)
             # Item is consumed immediately - no need to store it
@@ -576,17 +606,23 @@ class VidigiPriorityStore:
         """
         Cancels a pending get request by removing it from the queue.
         """
-        try:
-            # The get_event is the SimPy event object that was created
-            # and placed in the queue.
-            self.get_queue.remove(get_event)
-            # You might want to add a print statement for debugging:
-            # print(f"{self.env.now}: Successfully cancelled and removed a get request from the queue.")
-        except ValueError:
-            # This can happen if the request was already fulfilled between the
-            # timeout and the cancellation call. It's safe to ignore.
-            # print(f"{self.env.now}: Attempted to cancel a request that was no longer in the queue (likely already fulfilled).")
-            pass
+        # The get_event is the SimPy event object that was created and placed
+        # in the queue. If it isn't found, the request was already fulfilled
+        # between the timeout and the cancellation call, so it's safe to ignore.
+        for i, (_, _, request) in enumerate(self.get_queue):
+            if request is get_event:
+                # Move the last entry into the cancelled one's place and restore
+                # the heap order
+                last = self.get_queue.pop()
+                if i < len(self.get_queue):
+                    self.get_queue[i] = last
+                    heapq.heapify(self.get_queue)
+                break
+
+    @property
+    def queued_requests(self):
+        """Get the waiting get requests, in the order they will be served"""
+        return [request for _, _, request in sorted(self.get_queue)]
 
 # MARK: Priority Store Request
 class _OptimizedStoreRequest: